@@ -0,0 +1,26 @@
+"""product offers fingerprint and last verified timestamp
+
+Revision ID: 0001_product_fingerprint
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0001_product_fingerprint"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS offers_fingerprint VARCHAR(40)")
+    op.execute("ALTER TABLE products ADD COLUMN IF NOT EXISTS last_verified_at TIMESTAMP WITH TIME ZONE")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS last_verified_at")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS offers_fingerprint")
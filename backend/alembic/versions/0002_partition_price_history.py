@@ -0,0 +1,105 @@
+"""monthly range-partitioned price_history with composite indexes
+
+Revision ID: 0002_partition_price_history
+Revises: 0001_product_fingerprint
+Create Date: 2026-10-17 00:00:00
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0002_partition_price_history"
+down_revision: Union[str, None] = "0001_product_fingerprint"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+
+def _month_start(value: date, offset: int = 0) -> date:
+    month_index = value.year * 12 + value.month - 1 + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _is_partitioned(bind) -> bool:
+    return bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = 'price_history'"
+    )).first() is not None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if _is_partitioned(bind):
+        return
+
+    op.execute("ALTER TABLE price_history RENAME TO price_history_legacy")
+    op.execute("ALTER TABLE price_history_legacy RENAME CONSTRAINT price_history_pkey TO price_history_legacy_pkey")
+    op.execute("ALTER INDEX IF EXISTS ix_price_history_id RENAME TO ix_price_history_legacy_id")
+    op.execute("DROP INDEX IF EXISTS ix_price_history_product_recorded")
+    op.execute("DROP INDEX IF EXISTS ix_price_history_seller_recorded")
+
+    op.execute("""
+        CREATE TABLE price_history (
+            id INTEGER NOT NULL DEFAULT nextval('price_history_id_seq'),
+            product_id INTEGER NOT NULL REFERENCES products (id),
+            seller_id INTEGER NOT NULL REFERENCES sellers (id),
+            price DOUBLE PRECISION NOT NULL,
+            position INTEGER,
+            recorded_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, recorded_at)
+        ) PARTITION BY RANGE (recorded_at)
+    """)
+    op.execute("CREATE INDEX ix_price_history_id ON price_history (id)")
+    op.execute("CREATE INDEX ix_price_history_product_recorded ON price_history (product_id, recorded_at)")
+    op.execute("CREATE INDEX ix_price_history_seller_recorded ON price_history (seller_id, recorded_at)")
+    op.execute("CREATE TABLE price_history_default PARTITION OF price_history DEFAULT")
+
+    first_recorded = bind.execute(sa.text("SELECT min(recorded_at) FROM price_history_legacy")).scalar()
+    start = _month_start(first_recorded.date() if first_recorded else date.today())
+    end = _month_start(date.today(), MONTHS_AHEAD)
+    while start <= end:
+        op.execute(
+            f"CREATE TABLE price_history_{start.year:04d}_{start.month:02d} PARTITION OF price_history "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{_month_start(start, 1).isoformat()}')"
+        )
+        start = _month_start(start, 1)
+
+    op.execute("""
+        INSERT INTO price_history (id, product_id, seller_id, price, position, recorded_at)
+        SELECT id, product_id, seller_id, price, position, COALESCE(recorded_at, now())
+        FROM price_history_legacy
+    """)
+    op.execute("ALTER SEQUENCE price_history_id_seq OWNED BY price_history.id")
+    op.execute("DROP TABLE price_history_legacy")
+    op.execute("ANALYZE price_history")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE price_history RENAME TO price_history_partitioned")
+    op.execute("ALTER INDEX ix_price_history_id RENAME TO ix_price_history_partitioned_id")
+    op.execute("ALTER INDEX ix_price_history_product_recorded RENAME TO ix_price_history_partitioned_product_recorded")
+    op.execute("ALTER INDEX ix_price_history_seller_recorded RENAME TO ix_price_history_partitioned_seller_recorded")
+    op.execute("""
+        CREATE TABLE price_history (
+            id INTEGER NOT NULL DEFAULT nextval('price_history_id_seq') PRIMARY KEY,
+            product_id INTEGER NOT NULL REFERENCES products (id),
+            seller_id INTEGER NOT NULL REFERENCES sellers (id),
+            price DOUBLE PRECISION NOT NULL,
+            position INTEGER,
+            recorded_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+    """)
+    op.execute("CREATE INDEX ix_price_history_id ON price_history (id)")
+    op.execute("""
+        INSERT INTO price_history (id, product_id, seller_id, price, position, recorded_at)
+        SELECT id, product_id, seller_id, price, position, recorded_at
+        FROM price_history_partitioned
+    """)
+    op.execute("ALTER SEQUENCE price_history_id_seq OWNED BY price_history.id")
+    op.execute("DROP TABLE price_history_partitioned CASCADE")
@@ -0,0 +1,47 @@
+"""hourly and daily price_history rollup tiers
+
+Revision ID: 0003_price_history_rollups
+Revises: 0002_partition_price_history
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0003_price_history_rollups"
+down_revision: Union[str, None] = "0002_partition_price_history"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TIERS = ("hourly", "daily")
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    for tier in TIERS:
+        table = f"price_history_{tier}"
+        if inspector.has_table(table):
+            continue
+        op.create_table(
+            table,
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("seller_id", sa.Integer(), sa.ForeignKey("sellers.id"), nullable=False),
+            sa.Column("bucket", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("min_price", sa.Float(), nullable=False),
+            sa.Column("max_price", sa.Float(), nullable=False),
+            sa.Column("last_price", sa.Float(), nullable=False),
+            sa.Column("last_position", sa.Integer()),
+            sa.Column("samples", sa.Integer(), nullable=False, server_default="0"),
+            sa.UniqueConstraint("product_id", "seller_id", "bucket", name=f"uq_{table}_bucket"),
+        )
+        op.create_index(f"ix_{table}_id", table, ["id"])
+        op.create_index(f"ix_{table}_product_bucket", table, ["product_id", "bucket"])
+
+
+def downgrade() -> None:
+    for tier in TIERS:
+        op.execute(f"DROP TABLE IF EXISTS price_history_{tier}")
@@ -0,0 +1,46 @@
+"""denormalized latest market snapshot per product
+
+Revision ID: 0004_product_snapshots
+Revises: 0003_price_history_rollups
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0004_product_snapshots"
+down_revision: Union[str, None] = "0003_price_history_rollups"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("product_snapshots"):
+        return
+    op.create_table(
+        "product_snapshots",
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("prices", sa.JSON(), nullable=False),
+        sa.Column("min_price", sa.Float()),
+        sa.Column("max_price", sa.Float()),
+        sa.Column("avg_price", sa.Float()),
+        sa.Column("median_price", sa.Float()),
+        sa.Column("p25_price", sa.Float()),
+        sa.Column("p75_price", sa.Float()),
+        sa.Column("price_std", sa.Float()),
+        sa.Column("offers_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("sellers_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("in_stock_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("avg_seller_rating", sa.Float()),
+        sa.Column("top_offers", sa.JSON(), nullable=False),
+        sa.Column("price_buckets", sa.JSON()),
+        sa.Column("fingerprint", sa.String(40)),
+        sa.Column("parsed_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS product_snapshots")
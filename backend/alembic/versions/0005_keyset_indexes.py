@@ -0,0 +1,26 @@
+"""composite indexes for keyset pagination of products and jobs
+
+Revision ID: 0005_keyset_indexes
+Revises: 0004_product_snapshots
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0005_keyset_indexes"
+down_revision: Union[str, None] = "0004_product_snapshots"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_activity_id ON products (coalesce(updated_at, created_at), id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_parsing_jobs_created_id ON parsing_jobs (created_at, id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_parsing_jobs_created_id")
+    op.execute("DROP INDEX IF EXISTS ix_products_activity_id")
@@ -0,0 +1,27 @@
+"""trigram GIN indexes for product search
+
+Revision ID: 0006_product_search_trgm
+Revises: 0005_keyset_indexes
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0006_product_search_trgm"
+down_revision: Union[str, None] = "0005_keyset_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_category_trgm ON products USING gin (category gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_products_category_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_name_trgm")
@@ -0,0 +1,42 @@
+"""running per-day price accumulators updated at parse time
+
+Revision ID: 0007_product_stats_daily
+Revises: 0006_product_search_trgm
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0007_product_stats_daily"
+down_revision: Union[str, None] = "0006_product_search_trgm"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("product_stats_daily"):
+        return
+    op.create_table(
+        "product_stats_daily",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column("samples", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("price_sum", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("mean", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("m2", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("min_price", sa.Float()),
+        sa.Column("max_price", sa.Float()),
+        sa.Column("updated_at", sa.DateTime(timezone=True)),
+        sa.UniqueConstraint("product_id", "date", name="uq_product_stats_daily_date"),
+    )
+    op.create_index("ix_product_stats_daily_id", "product_stats_daily", ["id"])
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS product_stats_daily")
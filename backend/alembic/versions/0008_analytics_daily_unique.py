@@ -0,0 +1,35 @@
+"""one analytics_daily row per product and date for set-based upserts
+
+Revision ID: 0008_analytics_daily_unique
+Revises: 0007_product_stats_daily
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0008_analytics_daily_unique"
+down_revision: Union[str, None] = "0007_product_stats_daily"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    constraints = sa.inspect(op.get_bind()).get_unique_constraints("analytics_daily")
+    if any(constraint["name"] == "uq_analytics_daily_product_date" for constraint in constraints):
+        return
+    op.execute("""
+        DELETE FROM analytics_daily a
+        USING analytics_daily b
+        WHERE a.product_id = b.product_id
+          AND a.date = b.date
+          AND a.id < b.id
+    """)
+    op.create_unique_constraint("uq_analytics_daily_product_date", "analytics_daily", ["product_id", "date"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_analytics_daily_product_date", "analytics_daily", type_="unique")
@@ -0,0 +1,38 @@
+"""checkpoints for resumable analytics backfills
+
+Revision ID: 0009_backfill_checkpoints
+Revises: 0008_analytics_daily_unique
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "0009_backfill_checkpoints"
+down_revision: Union[str, None] = "0008_analytics_daily_unique"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("analytics_backfill_checkpoints"):
+        return
+    op.create_table(
+        "analytics_backfill_checkpoints",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("start_date", sa.Date(), nullable=False),
+        sa.Column("end_date", sa.Date(), nullable=False),
+        sa.Column("first_product_id", sa.Integer(), nullable=False),
+        sa.Column("last_product_id", sa.Integer(), nullable=False),
+        sa.Column("rows_written", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("completed_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint("start_date", "end_date", "first_product_id", "last_product_id", name="uq_analytics_backfill_chunk"),
+    )
+    op.create_index("ix_analytics_backfill_checkpoints_id", "analytics_backfill_checkpoints", ["id"])
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS analytics_backfill_checkpoints")
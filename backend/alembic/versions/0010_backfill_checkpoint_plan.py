@@ -0,0 +1,28 @@
+"""store the analytics backfill plan in its checkpoints
+
+Revision ID: 0010_backfill_checkpoint_plan
+Revises: 0009_backfill_checkpoints
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = "0010_backfill_checkpoint_plan"
+down_revision: Union[str, None] = "0009_backfill_checkpoints"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE analytics_backfill_checkpoints ADD COLUMN IF NOT EXISTS products_count INTEGER NOT NULL DEFAULT 0")
+    op.execute("ALTER TABLE analytics_backfill_checkpoints ADD COLUMN IF NOT EXISTS planned_at TIMESTAMP WITH TIME ZONE DEFAULT now()")
+    op.execute("ALTER TABLE analytics_backfill_checkpoints ALTER COLUMN completed_at DROP DEFAULT")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE analytics_backfill_checkpoints ALTER COLUMN completed_at SET DEFAULT now()")
+    op.execute("ALTER TABLE analytics_backfill_checkpoints DROP COLUMN IF EXISTS planned_at")
+    op.execute("ALTER TABLE analytics_backfill_checkpoints DROP COLUMN IF EXISTS products_count")
@@ -5,7 +5,11 @@ from app.core.database import get_db
 from app.schemas.analytics import PositionEstimate, AnalyticsResponse
 from app.services.analytics import AnalyticsService
 from app.services.product_service import ProductService
-from app.core.redis_client import redis_client
+from app.services.retention_service import RetentionService
+from app.services.snapshot_service import SnapshotService
+from app.services.stats_service import StatsService
+from app.services.batch_analytics import BatchAnalytics, OfferBatch
+from app.core.redis_client import async_redis_client
 from app.models.analytics import AnalyticsDaily
 from app.models.product import PriceHistory, Seller, Product, Offer
 from app.models.job import ParsingJob, JobStatus
@@ -38,16 +42,64 @@ async def estimate_position(
     return estimate
 
 
+@router.post("/products/{product_id}/positions", response_model=List[PositionEstimate])
+async def estimate_positions(
+    product_id: int,
+    user_prices: List[float] = Query(..., description="User prices in KZT"),
+    force_refresh: bool = Query(False, description="Force refresh cache"),
+    db: Session = Depends(get_db)
+):
+    from app.services.position_service import PositionService
+    
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    return await PositionService.get_exact_positions(
+        product.kaspi_id,
+        user_prices,
+        force_refresh
+    )
+
+
+@router.get("/products/{product_id}/price-at-position")
+async def get_price_at_position(
+    product_id: int,
+    positions: List[int] = Query(..., description="Positions, starting from 1"),
+    db: Session = Depends(get_db)
+):
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    prices = await async_redis_client.get_prices_at_positions(async_redis_client.price_index_key(str(product_id)), positions)
+    return [
+        {"position": position, "price": price}
+        for position, price in zip(positions, prices)
+    ]
+
+
 @router.get("/products/{product_id}/statistics")
 async def get_statistics(
     product_id: int,
     db: Session = Depends(get_db)
 ):
-    product = ProductService.get_product(db, product_id)
+    product = ProductService.get_product_with_snapshot(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    offers_data = redis_client.get_product_offers(str(product_id))
+    accumulator = StatsService.get(db, product_id)
+    intraday = StatsService.summary(accumulator) if accumulator else None
+    
+    if product.snapshot:
+        return {
+            **SnapshotService.statistics(product.snapshot),
+            "price_buckets": product.snapshot.price_buckets,
+            "offers_count": product.snapshot.offers_count,
+            "intraday": intraday
+        }
+    
+    offers_data = await async_redis_client.get_product_offers(str(product_id))
     
     if not offers_data:
         offers_data = [
@@ -60,26 +112,40 @@ async def get_statistics(
     
     statistics = AnalyticsService.calculate_statistics(offers_data)
     
-    buckets = redis_client.get_price_buckets(str(product_id))
+    buckets = await async_redis_client.get_price_buckets(str(product_id))
     
     return {
         **statistics,
         "price_buckets": buckets,
-        "offers_count": len(offers_data)
+        "offers_count": len(offers_data),
+        "intraday": intraday
     }
 
 
+@router.get("/products/{product_id}/intraday")
+async def get_intraday_statistics(
+    product_id: int,
+    target_date: date = None,
+    db: Session = Depends(get_db)
+):
+    accumulator = StatsService.get(db, product_id, target_date)
+    if not accumulator:
+        raise HTTPException(status_code=404, detail="No statistics collected for this date")
+    
+    return StatsService.summary(accumulator)
+
+
 @router.get("/products/{product_id}/analytics", response_model=AnalyticsResponse)
 async def get_analytics(
     product_id: int,
     target_date: date = None,
     db: Session = Depends(get_db)
 ):
-    product = ProductService.get_product(db, product_id)
+    product = ProductService.get_product_with_snapshot(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    target_date = target_date or date.today()
+    target_date = target_date or datetime.utcnow().date()
     
     analytics = db.query(AnalyticsDaily).filter(
         AnalyticsDaily.product_id == product_id,
@@ -87,35 +153,34 @@ async def get_analytics(
     ).first()
     
     if not analytics:
-        offers_data = redis_client.get_product_offers(str(product_id))
-        if not offers_data:
-            offers_data = [
-                {
-                    "price": o.price,
-                    "position": o.position,
-                    "in_stock": o.in_stock,
-                    "seller_rating": o.seller.rating if o.seller else None,
-                    "seller_name": o.seller.name if o.seller else ""
-                } for o in product.offers
-            ]
-        
-        if not offers_data:
-            raise HTTPException(status_code=404, detail="No offers data available")
-        
-        stats = AnalyticsService.calculate_statistics(offers_data)
-        buckets = redis_client.get_price_buckets(str(product_id))
-        
-        sorted_offers = sorted([o for o in offers_data if o.get("price")], key=lambda x: x.get("price", 0))
-        
-        price_pos_1 = sorted_offers[0]["price"] if sorted_offers else None
-        price_pos_3 = sorted_offers[2]["price"] if len(sorted_offers) > 2 else None
-        price_pos_5 = sorted_offers[4]["price"] if len(sorted_offers) > 4 else None
-        price_pos_10 = sorted_offers[9]["price"] if len(sorted_offers) > 9 else None
-        
-        ratings = [o.get("seller_rating") for o in offers_data if o.get("seller_rating")]
-        avg_rating = sum(ratings) / len(ratings) if ratings else None
-        
-        in_stock_count = sum(1 for o in offers_data if o.get("in_stock", True))
+        accumulator = StatsService.get(db, product_id, target_date)
+        if accumulator and product.snapshot:
+            stats = StatsService.daily_metrics(accumulator, product.snapshot)
+            buckets = product.snapshot.price_buckets
+        else:
+            if product.snapshot:
+                offers_data = SnapshotService.offers(product.snapshot)
+            else:
+                offers_data = await async_redis_client.get_product_offers(str(product_id))
+            if not offers_data:
+                offers_data = [
+                    {
+                        "price": o.price,
+                        "position": o.position,
+                        "in_stock": o.in_stock,
+                        "seller_rating": o.seller.rating if o.seller else None,
+                        "seller_name": o.seller.name if o.seller else ""
+                    } for o in product.offers
+                ]
+            
+            if not offers_data:
+                raise HTTPException(status_code=404, detail="No offers data available")
+            
+            stats = BatchAnalytics.calculate_daily_metrics(OfferBatch.from_offers([offers_data]))[0]
+            if product.snapshot:
+                buckets = product.snapshot.price_buckets
+            else:
+                buckets = await async_redis_client.get_price_buckets(str(product_id))
         
         previous_day = db.query(AnalyticsDaily).filter(
             AnalyticsDaily.product_id == product_id,
@@ -130,8 +195,7 @@ async def get_analytics(
             delta_price = stats["avg_price"] - previous_day.avg_price
             delta_percent = (delta_price / previous_day.avg_price * 100) if previous_day.avg_price > 0 else 0
         
-        unique_sellers = len(set(o.get("seller_name", "") for o in offers_data if o.get("seller_name")))
-        current_sellers = buckets.get("total_sellers_count") if buckets else (unique_sellers if unique_sellers > 0 else len(offers_data))
+        current_sellers = buckets.get("total_sellers_count") if buckets else (stats["unique_sellers"] or stats["offers_count"])
         if previous_day and previous_day.sellers_count:
             sellers_delta = current_sellers - previous_day.sellers_count
         
@@ -143,16 +207,16 @@ async def get_analytics(
             avg_price=stats["avg_price"],
             median_price=stats["median_price"],
             price_std=stats["price_std"] or 0,
-            offers_count=len(offers_data),
+            offers_count=stats["offers_count"],
             sellers_count=current_sellers,
-            top_sellers_count=buckets.get("top_sellers_count") if buckets else len(offers_data),
-            estimated_total_sellers=buckets.get("total_sellers_count") if buckets else (len(offers_data) * 4),
-            price_position_1=price_pos_1,
-            price_position_3=price_pos_3,
-            price_position_5=price_pos_5,
-            price_position_10=price_pos_10,
-            avg_seller_rating=avg_rating,
-            in_stock_count=in_stock_count,
+            top_sellers_count=buckets.get("top_sellers_count") if buckets else stats["offers_count"],
+            estimated_total_sellers=buckets.get("total_sellers_count") if buckets else (stats["offers_count"] * 4),
+            price_position_1=stats["price_position_1"],
+            price_position_3=stats["price_position_3"],
+            price_position_5=stats["price_position_5"],
+            price_position_10=stats["price_position_10"],
+            avg_seller_rating=stats["avg_seller_rating"],
+            in_stock_count=stats["in_stock_count"],
             delta_price=delta_price,
             delta_percent=delta_percent,
             sellers_delta=sellers_delta
@@ -178,27 +242,20 @@ async def get_price_history(
     start_datetime = datetime.combine(start_date, datetime.min.time())
     end_datetime = datetime.combine(end_date, datetime.max.time())
     
-    history_records = db.query(PriceHistory).filter(
-        and_(
-            PriceHistory.product_id == product_id,
-            PriceHistory.recorded_at >= start_datetime,
-            PriceHistory.recorded_at <= end_datetime
-        )
-    ).order_by(PriceHistory.recorded_at).all()
+    history_records = RetentionService.get_history(db, product_id, start_datetime, end_datetime)
     
     dates_data = {}
     for record in history_records:
-        record_date = record.recorded_at.date()
+        record_date = record["recorded_at"].date()
         if record_date not in dates_data:
             dates_data[record_date] = []
         
-        seller = db.query(Seller).filter(Seller.id == record.seller_id).first()
         dates_data[record_date].append({
-            "seller_id": record.seller_id,
-            "seller_name": seller.name if seller else "Unknown",
-            "price": record.price,
-            "position": record.position,
-            "recorded_at": record.recorded_at.isoformat()
+            "seller_id": record["seller_id"],
+            "seller_name": record["seller_name"],
+            "price": record["price"],
+            "position": record["position"],
+            "recorded_at": record["recorded_at"].isoformat()
         })
     
     result = []
@@ -228,32 +285,22 @@ async def compare_prices(
         raise HTTPException(status_code=404, detail="Product not found")
     
     def get_date_data(target_date: date):
-        start_datetime = datetime.combine(target_date, datetime.min.time())
-        end_datetime = datetime.combine(target_date, datetime.max.time())
-        
-        history_records = db.query(PriceHistory).filter(
-            and_(
-                PriceHistory.product_id == product_id,
-                PriceHistory.recorded_at >= start_datetime,
-                PriceHistory.recorded_at <= end_datetime
-            )
-        ).order_by(PriceHistory.recorded_at.desc()).all()
+        history_records = RetentionService.get_day_history(db, product_id, target_date)[::-1]
         
         if not history_records:
             return None
         
-        latest_time = history_records[0].recorded_at
-        latest_records = [r for r in history_records if r.recorded_at.date() == latest_time.date() and abs((r.recorded_at - latest_time).total_seconds()) < 3600]
+        latest_time = history_records[0]["recorded_at"]
+        latest_records = [r for r in history_records if r["recorded_at"].date() == latest_time.date() and abs((r["recorded_at"] - latest_time).total_seconds()) < 3600]
         
         offers = []
         for record in latest_records:
-            seller = db.query(Seller).filter(Seller.id == record.seller_id).first()
             offers.append({
-                "seller_id": record.seller_id,
-                "seller_name": seller.name if seller else "Unknown",
-                "price": record.price,
-                "position": record.position,
-                "recorded_at": record.recorded_at.isoformat()
+                "seller_id": record["seller_id"],
+                "seller_name": record["seller_name"],
+                "price": record["price"],
+                "position": record["position"],
+                "recorded_at": record["recorded_at"].isoformat()
             })
         
         if not offers:
@@ -294,42 +341,81 @@ async def compare_prices(
     return comparison
 
 
+@router.post("/products/{product_id}/weighted-rank")
+async def get_weighted_rank(
+    product_id: int,
+    user_prices: List[float] = Query(..., description="Candidate user prices in KZT"),
+    user_rating: float = Query(None, description="User seller rating"),
+    price_weight: float = Query(None, description="Weight of the price rank"),
+    rating_weight: float = Query(None, description="Weight of the seller rating"),
+    reviews_weight: float = Query(None, description="Weight of the reviews count"),
+    db: Session = Depends(get_db)
+):
+    product = ProductService.get_product_with_snapshot(db, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    
+    if product.snapshot:
+        offers_data = SnapshotService.offers(product.snapshot)
+    else:
+        offers_data = [
+            {
+                "price": o.price,
+                "seller_name": o.seller.name,
+                "seller_rating": o.seller.rating,
+                "seller_reviews_count": o.seller.reviews_count,
+                "position": o.position
+            }
+            for o in product.offers
+        ]
+    
+    weights = {
+        key: value
+        for key, value in (("price", price_weight), ("rating", rating_weight), ("reviews", reviews_weight))
+        if value is not None
+    }
+    return AnalyticsService.calculate_weighted_rank(
+        offers_data,
+        user_rating=user_rating,
+        weights=weights,
+        user_prices=user_prices
+    )
+
+
 @router.get("/products/{product_id}/advanced")
 async def get_advanced_analytics(
     product_id: int,
     user_price: float = Query(None, description="User price for analysis"),
     db: Session = Depends(get_db)
 ):
-    product = ProductService.get_product(db, product_id)
+    product = ProductService.get_product_with_snapshot(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    offers_data = [
-        {
-            "price": o.price,
-            "seller_name": o.seller.name,
-            "seller_rating": o.seller.rating,
-            "seller_reviews_count": o.seller.reviews_count,
-            "position": o.position
-        }
-        for o in product.offers
-    ]
+    if product.snapshot:
+        offers_data = SnapshotService.offers(product.snapshot)
+    else:
+        offers_data = [
+            {
+                "price": o.price,
+                "seller_name": o.seller.name,
+                "seller_rating": o.seller.rating,
+                "seller_reviews_count": o.seller.reviews_count,
+                "position": o.position
+            }
+            for o in product.offers
+        ]
     
     price_history_data = []
     cutoff_date = datetime.utcnow() - timedelta(days=90)
-    from app.models.product import PriceHistory
-    history = db.query(PriceHistory).filter(
-        PriceHistory.product_id == product_id,
-        PriceHistory.recorded_at >= cutoff_date
-    ).order_by(PriceHistory.recorded_at).all()
+    history = RetentionService.get_history(db, product_id, cutoff_date)
     
     for record in history:
-        seller = db.query(Seller).filter(Seller.id == record.seller_id).first()
         price_history_data.append({
-            "date": record.recorded_at.date().isoformat(),
-            "price": record.price,
-            "position": record.position,
-            "seller_name": seller.name if seller else "Unknown"
+            "date": record["recorded_at"].date().isoformat(),
+            "price": record["price"],
+            "position": record["position"],
+            "seller_name": record["seller_name"]
         })
     
     price_dist = AnalyticsService.calculate_price_distribution(offers_data)
@@ -394,23 +480,26 @@ async def analyze_scenario(
     current_price: float = Query(..., description="Current price"),
     db: Session = Depends(get_db)
 ):
-    product = ProductService.get_product(db, product_id)
+    product = ProductService.get_product_with_snapshot(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    offers_data = [
-        {
-            "price": o.price,
-            "seller_name": o.seller.name,
-            "seller_rating": o.seller.rating,
-            "seller_reviews_count": o.seller.reviews_count,
-            "position": o.position
-        }
-        for o in product.offers
-    ]
+    if product.snapshot:
+        offers_data = SnapshotService.offers(product.snapshot)
+    else:
+        offers_data = [
+            {
+                "price": o.price,
+                "seller_name": o.seller.name,
+                "seller_rating": o.seller.rating,
+                "seller_reviews_count": o.seller.reviews_count,
+                "position": o.position
+            }
+            for o in product.offers
+        ]
     
-    stats = AnalyticsService.calculate_statistics(offers_data)
-    position_est = AnalyticsService.calculate_position_estimate(str(product_id), scenario_price, offers_data)
+    stats = SnapshotService.statistics(product.snapshot) if product.snapshot else AnalyticsService.calculate_statistics(offers_data)
+    position_est = await AnalyticsService.calculate_position_estimate_async(str(product_id), scenario_price, offers_data)
     
     from app.services.ai_service import AIService
     ai_service = AIService()
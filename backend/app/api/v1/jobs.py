@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.core.database import get_db
-from app.schemas.job import JobResponse
+from app.core.pagination import keyset_paginate
+from app.schemas.job import JobResponse, JobPage
 from app.models.job import ParsingJob
-from app.core.redis_client import redis_client
+from app.core.redis_client import async_redis_client
 
 router = APIRouter()
 
@@ -19,6 +20,22 @@ async def list_jobs(
     return jobs
 
 
+@router.get("/page", response_model=JobPage)
+async def list_jobs_page(
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=500, description="Maximum number of records to return"),
+    db: Session = Depends(get_db)
+):
+    try:
+        jobs, next_cursor = keyset_paginate(
+            db.query(ParsingJob), ParsingJob.created_at, ParsingJob.id, limit, cursor,
+            key=lambda job: (job.created_at, job.id)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JobPage(items=jobs, next_cursor=next_cursor)
+
+
 @router.get("/{job_id}", response_model=JobResponse)
 async def get_job(
     job_id: int,
@@ -26,7 +43,7 @@ async def get_job(
 ):
     job = db.query(ParsingJob).filter(ParsingJob.id == job_id).first()
     if not job:
-        status = redis_client.get_job_status(str(job_id))
+        status = await async_redis_client.get_job_status(str(job_id))
         if status:
             return status
         return None
@@ -38,7 +55,7 @@ async def get_job_status(
     job_id: int,
     db: Session = Depends(get_db)
 ):
-    status = redis_client.get_job_status(str(job_id))
+    status = await async_redis_client.get_job_status(str(job_id))
     if status:
         return status
     
@@ -8,11 +8,12 @@ import io
 import json
 from app.core.database import get_db
 from app.core.rate_limit import limiter
-from app.schemas.product import ProductCreate, ProductResponse, BulkProductCreate, ProductUpdate
+from app.schemas.product import ProductCreate, ProductResponse, BulkProductCreate, ProductUpdate, ProductPage
 from app.schemas.job import JobResponse
 from app.services.product_service import ProductService
+from app.services.search_service import SearchService
 from app.models.job import ParsingJob
-from app.core.redis_client import redis_client
+from app.core.redis_client import async_redis_client
 import uuid
 
 router = APIRouter()
@@ -31,7 +32,7 @@ async def create_product(
     db.commit()
     db.refresh(job)
     
-    redis_client.set_job_status(str(job.id), "pending")
+    await async_redis_client.set_job_status(str(job.id), "pending")
     
     background_tasks.add_task(
         ProductService.parse_and_save_product,
@@ -61,12 +62,13 @@ async def create_products_bulk(
     
     for job in jobs:
         db.refresh(job)
-        redis_client.set_job_status(str(job.id), "pending")
-        background_tasks.add_task(
-            ProductService.parse_and_save_product,
-            job.kaspi_url,
-            job.id
-        )
+        await async_redis_client.set_job_status(str(job.id), "pending")
+    
+    background_tasks.add_task(
+        ProductService.run_parse_jobs,
+        [job.kaspi_url for job in jobs],
+        [job.id for job in jobs]
+    )
     
     return jobs
 
@@ -81,16 +83,46 @@ async def list_products(
     db: Session = Depends(get_db)
 ):
     products = ProductService.list_products(db, skip=skip, limit=limit, search=search)
+    cached_counts = await async_redis_client.get_offer_counts([str(p.id) for p in products if p.snapshot is None])
     result = []
     for product in products:
-        offers_data = redis_client.get_product_offers(str(product.id))
-        total_count = len(offers_data) if offers_data else len(product.offers)
+        if product.snapshot:
+            total_count = product.snapshot.offers_count
+        else:
+            total_count = cached_counts.get(str(product.id)) or len(product.offers)
         product_dict = ProductResponse.model_validate(product).model_dump()
         product_dict["total_offers_count"] = total_count
         result.append(ProductResponse(**product_dict))
     return result
 
 
+@router.get("/page", response_model=ProductPage)
+@limiter.limit("60/minute")
+async def list_products_page(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of records to return"),
+    search: Optional[str] = Query(None, description="Search by name or category"),
+    db: Session = Depends(get_db)
+):
+    try:
+        items, next_cursor = ProductService.list_products_page(db, limit=limit, cursor=cursor, search=search)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ProductPage(items=items, next_cursor=next_cursor)
+
+
+@router.get("/suggest")
+@limiter.limit("120/minute")
+async def suggest_products(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Name prefix"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of suggestions"),
+    db: Session = Depends(get_db)
+):
+    return SearchService.suggest(db, q, limit=limit)
+
+
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: int,
@@ -99,8 +131,7 @@ async def get_product(
     product = ProductService.get_product(db, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    offers_data = redis_client.get_product_offers(str(product_id))
-    total_count = len(offers_data) if offers_data else len(product.offers)
+    total_count = (await async_redis_client.get_offer_counts([str(product_id)]))[str(product_id)] or len(product.offers)
     product_dict = ProductResponse.model_validate(product).model_dump()
     product_dict["total_offers_count"] = total_count
     return ProductResponse(**product_dict)
@@ -114,8 +145,7 @@ async def get_product_by_kaspi_id(
     product = ProductService.get_product_by_kaspi_id(db, kaspi_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    offers_data = redis_client.get_product_offers(str(product.id))
-    total_count = len(offers_data) if offers_data else len(product.offers)
+    total_count = (await async_redis_client.get_offer_counts([str(product.id)]))[str(product.id)] or len(product.offers)
     product_dict = ProductResponse.model_validate(product).model_dump()
     product_dict["total_offers_count"] = total_count
     return ProductResponse(**product_dict)
@@ -158,9 +188,14 @@ async def delete_product(
     db.delete(product)
     db.commit()
     
-    redis_client.delete_key(f"product:{product_id}:offers")
-    redis_client.delete_key(f"product:{product_id}:buckets")
-    redis_client.delete_key(f"product:{product_id}:all_prices")
+    await async_redis_client.delete_keys(
+        f"product:{product_id}:offers",
+        f"product:{product_id}:offers_count",
+        f"product:{product_id}:buckets",
+        f"product:{product_id}:all_prices",
+        async_redis_client.price_index_key(str(product_id))
+    )
+    await async_redis_client.publish_invalidation(f"product:{product_id}")
     
     return None
 
@@ -181,7 +216,7 @@ async def parse_product(
     db.commit()
     db.refresh(job)
     
-    redis_client.set_job_status(str(job.id), "pending")
+    await async_redis_client.set_job_status(str(job.id), "pending")
     
     background_tasks.add_task(
         ProductService.parse_and_save_product,
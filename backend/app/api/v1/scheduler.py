@@ -18,7 +18,7 @@ router = APIRouter()
 async def list_scheduler_configs(db: Session = Depends(get_db)):
     configs = db.query(SchedulerConfig).all()
     
-    default_jobs = ["daily_price_update", "daily_analytics_aggregation"]
+    default_jobs = ["daily_price_update", "daily_analytics_aggregation", "price_history_maintenance", "price_history_retention"]
     existing_job_ids = {c.job_id for c in configs}
     
     for job_id in default_jobs:
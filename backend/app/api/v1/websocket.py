@@ -2,7 +2,7 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.models.job import ParsingJob, JobStatus
-from app.core.redis_client import redis_client
+from app.core.redis_client import async_redis_client
 import json
 import asyncio
 from typing import Dict, Set
@@ -87,7 +87,7 @@ async def websocket_endpoint(websocket: WebSocket, job_id: int):
     await manager.connect(websocket, job_id)
     try:
         while True:
-            status = redis_client.get_job_status(str(job_id))
+            status = await async_redis_client.get_job_status(str(job_id))
             if status:
                 await manager.send_personal_message({
                     "type": "status_update",
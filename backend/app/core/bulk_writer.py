@@ -0,0 +1,91 @@
+from sqlalchemy import Table, insert
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+from datetime import date, datetime
+from app.core.config import settings
+from app.core.metrics import bulk_rows_written
+import csv
+import io
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BulkWriter:
+    def __init__(self, table: Table, columns: List[str], batch_size: Optional[int] = None):
+        self.table = table
+        self.columns = columns
+        self.batch_size = batch_size or settings.BULK_WRITE_BATCH_SIZE
+        self.total_rows = 0
+        self.total_seconds = 0.0
+        self._rows: List[Dict] = []
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def add(self, row: Dict):
+        self._rows.append(row)
+    
+    def extend(self, rows: Iterable[Dict]):
+        self._rows.extend(rows)
+    
+    def clear(self):
+        self._rows = []
+    
+    def should_flush(self) -> bool:
+        return len(self._rows) >= self.batch_size
+    
+    @property
+    def rows_per_second(self) -> float:
+        return self.total_rows / self.total_seconds if self.total_seconds > 0 else 0.0
+    
+    def flush(self, db: Session) -> int:
+        if not self._rows:
+            return 0
+        
+        rows, self._rows = self._rows, []
+        started = time.perf_counter()
+        if db.get_bind().dialect.name == "postgresql":
+            self._copy(db, rows)
+        else:
+            db.execute(insert(self.table), rows)
+        elapsed = time.perf_counter() - started
+        
+        self.total_rows += len(rows)
+        self.total_seconds += elapsed
+        bulk_rows_written.labels(table=self.table.name).inc(len(rows))
+        logger.info(
+            f"Wrote {len(rows)} rows to {self.table.name} in {elapsed:.3f}s "
+            f"({len(rows) / elapsed if elapsed > 0 else 0:.0f} rows/s)"
+        )
+        return len(rows)
+    
+    def _copy(self, db: Session, rows: List[Dict]):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([self._format(row.get(column)) for column in self.columns])
+        buffer.seek(0)
+        
+        cursor = db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {self.table.name} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        finally:
+            cursor.close()
+    
+    @staticmethod
+    def _format(value):
+        if value is None:
+            return None
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, bool):
+            return "t" if value else "f"
+        return value
+    
+    def summary(self) -> str:
+        return f"{self.total_rows} rows to {self.table.name} in {self.total_seconds:.2f}s ({self.rows_per_second:.0f} rows/s)"
@@ -0,0 +1,140 @@
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Union
+import json
+import math
+import struct
+import sys
+
+PRICES_MAGIC = b"\x00PA1"
+OFFERS_MAGIC = b"\x00OF1"
+
+OFFER_FIELDS = frozenset(("price", "seller_name", "seller_rating", "seller_reviews_count", "position", "in_stock"))
+PRICES_HEADER = struct.Struct("<4sI")
+OFFERS_HEADER = struct.Struct("<4sI")
+
+NO_INT = -1
+NO_BOOL = 2
+
+
+def _as_bytes(data: Union[bytes, str]) -> bytes:
+    return data.encode() if isinstance(data, str) else data
+
+
+class JsonCodec:
+    name = "json"
+    
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value).encode()
+    
+    def decode(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class PriceArrayCodec:
+    name = "binary"
+    
+    def encode(self, prices: Sequence[float]) -> bytes:
+        values = array("d", prices)
+        if sys.byteorder != "little":
+            values.byteswap()
+        return PRICES_HEADER.pack(PRICES_MAGIC, len(values)) + values.tobytes()
+    
+    def decode(self, data: Union[bytes, str]) -> Union[memoryview, List[float]]:
+        data = _as_bytes(data)
+        if not data.startswith(PRICES_MAGIC):
+            return json.loads(data)
+        
+        _, count = PRICES_HEADER.unpack_from(data)
+        if sys.byteorder != "little":
+            values = array("d", data[PRICES_HEADER.size:])
+            values.byteswap()
+            return memoryview(values)
+        return memoryview(data)[PRICES_HEADER.size:PRICES_HEADER.size + count * 8].cast("d")
+
+
+class OffersCodec:
+    name = "binary"
+    
+    def __init__(self, fallback: Optional[JsonCodec] = None):
+        self.fallback = fallback or JsonCodec()
+    
+    def _fits_schema(self, offers: List[Dict]) -> bool:
+        for offer in offers:
+            if not set(offer) <= OFFER_FIELDS or not isinstance(offer.get("price"), (int, float)):
+                return False
+            if "\x00" in (offer.get("seller_name") or ""):
+                return False
+        return True
+    
+    def encode(self, offers: List[Dict]) -> bytes:
+        if not self._fits_schema(offers):
+            return self.fallback.encode(offers)
+        
+        prices = array("d", (float(o["price"]) for o in offers))
+        ratings = array("d", (math.nan if o.get("seller_rating") is None else float(o["seller_rating"]) for o in offers))
+        reviews = array("i", (NO_INT if o.get("seller_reviews_count") is None else int(o["seller_reviews_count"]) for o in offers))
+        positions = array("i", (NO_INT if o.get("position") is None else int(o["position"]) for o in offers))
+        in_stock = bytes(NO_BOOL if o.get("in_stock") is None else int(bool(o["in_stock"])) for o in offers)
+        if sys.byteorder != "little":
+            for column in (prices, ratings, reviews, positions):
+                column.byteswap()
+        
+        names = "\x00".join(o.get("seller_name") or "" for o in offers).encode()
+        return b"".join([
+            OFFERS_HEADER.pack(OFFERS_MAGIC, len(offers)),
+            prices.tobytes(),
+            ratings.tobytes(),
+            reviews.tobytes(),
+            positions.tobytes(),
+            in_stock,
+            names
+        ])
+    
+    def decode(self, data: Union[bytes, str]) -> List[Dict]:
+        data = _as_bytes(data)
+        if not data.startswith(OFFERS_MAGIC):
+            return self.fallback.decode(data)
+        
+        _, count = OFFERS_HEADER.unpack_from(data)
+        if count == 0:
+            return []
+        
+        columns = []
+        offset = OFFERS_HEADER.size
+        for typecode, width in (("d", 8), ("d", 8), ("i", 4), ("i", 4)):
+            column = array(typecode)
+            column.frombytes(data[offset:offset + count * width])
+            if sys.byteorder != "little":
+                column.byteswap()
+            columns.append(column)
+            offset += count * width
+        prices, ratings, reviews, positions = columns
+        in_stock = data[offset:offset + count]
+        names = data[offset + count:].decode().split("\x00")
+        
+        offers = []
+        for i in range(count):
+            offer = {"price": prices[i], "seller_name": names[i]}
+            if not math.isnan(ratings[i]):
+                offer["seller_rating"] = ratings[i]
+            if reviews[i] != NO_INT:
+                offer["seller_reviews_count"] = reviews[i]
+            if positions[i] != NO_INT:
+                offer["position"] = positions[i]
+            if in_stock[i] != NO_BOOL:
+                offer["in_stock"] = in_stock[i] == 1
+            offers.append(offer)
+        return offers
+
+
+def get_codecs(name: str) -> Dict[str, Any]:
+    json_codec = JsonCodec()
+    if name == "json":
+        return {"prices": json_codec, "offers": json_codec, "buckets": json_codec}
+    if name != "binary":
+        raise ValueError(f"Unknown Redis codec: {name}")
+    return {"prices": PriceArrayCodec(), "offers": OffersCodec(json_codec), "buckets": json_codec}
+
+
+def get_decoders() -> Dict[str, Any]:
+    return get_codecs("binary")
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.core.metrics import local_cache_requests
+import threading
+import time
+
+MISSING = object()
+
+
+class LocalCache:
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = False
+        self._groups: "OrderedDict[str, Dict[str, Tuple[float, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, group: str, field: str) -> Any:
+        if not self.enabled:
+            return MISSING
+        
+        with self._lock:
+            entries = self._groups.get(group)
+            entry = entries.get(field) if entries else None
+            if entry is not None and entry[0] > time.monotonic():
+                self._groups.move_to_end(group)
+                local_cache_requests.labels(cache=field, result="hit").inc()
+                return entry[1]
+            if entry is not None:
+                del entries[field]
+        
+        local_cache_requests.labels(cache=field, result="miss").inc()
+        return MISSING
+    
+    def set(self, group: str, field: str, value: Any, ttl: Optional[float] = None):
+        if not self.enabled or value is None:
+            return
+        
+        expires_at = time.monotonic() + (ttl or self.ttl)
+        with self._lock:
+            self._groups.setdefault(group, {})[field] = (expires_at, value)
+            self._groups.move_to_end(group)
+            while len(self._groups) > self.max_size:
+                self._groups.popitem(last=False)
+    
+    def invalidate(self, group: str):
+        with self._lock:
+            self._groups.pop(group, None)
+    
+    def clear(self):
+        with self._lock:
+            self._groups.clear()
@@ -6,6 +6,10 @@ parsing_duration = Histogram('parsing_duration_seconds', 'Parsing duration in se
 active_jobs = Gauge('active_parsing_jobs', 'Number of active parsing jobs')
 failed_parsing = Counter('parsing_failed_total', 'Total failed parsing requests')
 successful_parsing = Counter('parsing_successful_total', 'Total successful parsing requests')
+unchanged_snapshots = Counter('parsing_unchanged_snapshots_total', 'Parsed snapshots skipped because offers did not change')
+bulk_rows_written = Counter('bulk_rows_written_total', 'Rows written through bulk writers', ['table'])
+local_cache_requests = Counter('local_cache_requests_total', 'In-process cache lookups in front of Redis', ['cache', 'result'])
+upstream_rate_limit = Gauge('kaspi_upstream_rate_limit', 'Current Kaspi request rate limit in requests per second')
 
 def get_metrics():
     return generate_latest()
@@ -0,0 +1,40 @@
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from typing import Any, Callable, List, Optional, Tuple
+from datetime import datetime
+import base64
+import json
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_paginate(
+    query: Query,
+    sort_column,
+    id_column,
+    limit: int,
+    cursor: Optional[str],
+    key: Callable[[Any], Tuple[datetime, int]]
+) -> Tuple[List, Optional[str]]:
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
@@ -1,36 +1,145 @@
 import redis
+import redis.asyncio as aioredis
 from app.core.config import settings
-from typing import Optional, List, Dict
+from app.core.codecs import get_codecs, get_decoders
+from app.core.local_cache import LocalCache, MISSING
+from typing import Callable, Optional, List, Dict, Sequence, Tuple
+import asyncio
 import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
 
 
 class RedisClient:
     def __init__(self):
         self.client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.raw = redis.from_url(settings.REDIS_URL, decode_responses=False)
+        self.codecs = get_codecs(settings.REDIS_CODEC)
+        self.decoders = get_decoders()
+        self.local = LocalCache(settings.LOCAL_CACHE_SIZE, settings.LOCAL_CACHE_TTL)
+        self._listener = None
+    
+    def start_invalidation_listener(self):
+        if self._listener is not None or not settings.LOCAL_CACHE_ENABLED:
+            return
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidation})
+        except redis.RedisError as e:
+            logger.warning(f"Cache invalidation listener not started, local cache disabled: {e}")
+            return
+        self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=self._on_listener_error)
+        self.local.enabled = True
+    
+    def stop_invalidation_listener(self):
+        self.local.enabled = False
+        self.local.clear()
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+    
+    def _on_invalidation(self, message: Dict):
+        self.local.invalidate(message["data"])
+    
+    def _on_listener_error(self, error: Exception, pubsub, thread):
+        logger.warning(f"Cache invalidation listener error, clearing local cache: {error}")
+        self.local.clear()
+        time.sleep(1.0)
+    
+    def publish_invalidation(self, group: str):
+        self.local.invalidate(group)
+        self.client.publish(INVALIDATION_CHANNEL, group)
+    
+    def _cached_many(self, field: str, product_ids: List[str], loader: Callable[[List[str]], Dict]) -> Dict:
+        result = {}
+        missing = []
+        for product_id in product_ids:
+            value = self.local.get(f"product:{product_id}", field)
+            if value is MISSING:
+                missing.append(product_id)
+            else:
+                result[product_id] = value
+        
+        if missing:
+            for product_id, value in loader(missing).items():
+                self.local.set(f"product:{product_id}", field, value)
+                result[product_id] = value
+        return result
     
     def get_product_offers(self, product_id: str) -> Optional[List[Dict]]:
-        key = f"product:{product_id}:offers"
-        data = self.client.get(key)
-        if data:
-            return json.loads(data)
-        return None
+        return self.get_many_product_offers([product_id])[product_id]
     
     def set_product_offers(self, product_id: str, offers: List[Dict], ttl: int = None):
         key = f"product:{product_id}:offers"
         ttl = ttl or settings.REDIS_TTL
-        self.client.setex(key, ttl, json.dumps(offers))
+        pipe = self.raw.pipeline(transaction=False)
+        pipe.setex(key, ttl, self.codecs["offers"].encode(offers))
+        pipe.setex(f"product:{product_id}:offers_count", ttl, len(offers))
+        pipe.execute()
+        self.local.invalidate(f"product:{product_id}")
+    
+    def get_many_product_offers(self, product_ids: List[str]) -> Dict[str, Optional[List[Dict]]]:
+        return self._cached_many("offers", product_ids, self._fetch_product_offers)
+    
+    def _fetch_product_offers(self, product_ids: List[str]) -> Dict[str, Optional[List[Dict]]]:
+        if not product_ids:
+            return {}
+        values = self.raw.mget([f"product:{product_id}:offers" for product_id in product_ids])
+        return {
+            product_id: self.decoders["offers"].decode(data) if data else None
+            for product_id, data in zip(product_ids, values)
+        }
+    
+    def get_offer_counts(self, product_ids: List[str]) -> Dict[str, Optional[int]]:
+        return self._cached_many("offers_count", product_ids, self._fetch_offer_counts)
+    
+    def _fetch_offer_counts(self, product_ids: List[str]) -> Dict[str, Optional[int]]:
+        if not product_ids:
+            return {}
+        values = self.raw.mget([f"product:{product_id}:offers_count" for product_id in product_ids])
+        counts = {
+            product_id: int(data) if data is not None else None
+            for product_id, data in zip(product_ids, values)
+        }
+        
+        missing = [product_id for product_id, count in counts.items() if count is None]
+        if missing:
+            for product_id, offers in self.get_many_product_offers(missing).items():
+                if offers is not None:
+                    counts[product_id] = len(offers)
+        return counts
     
     def get_price_buckets(self, product_id: str) -> Optional[Dict]:
-        key = f"product:{product_id}:buckets"
-        data = self.client.get(key)
-        if data:
-            return json.loads(data)
-        return None
+        return self.get_many_buckets([product_id])[product_id]
+    
+    def get_many_buckets(self, product_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        return self._cached_many("buckets", product_ids, self._fetch_buckets)
+    
+    def _fetch_buckets(self, product_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        if not product_ids:
+            return {}
+        values = self.raw.mget([f"product:{product_id}:buckets" for product_id in product_ids])
+        return {
+            product_id: self.decoders["buckets"].decode(data) if data else None
+            for product_id, data in zip(product_ids, values)
+        }
     
     def set_price_buckets(self, product_id: str, buckets: Dict, ttl: int = None):
         key = f"product:{product_id}:buckets"
         ttl = ttl or settings.REDIS_TTL
-        self.client.setex(key, ttl, json.dumps(buckets))
+        self.raw.setex(key, ttl, self.codecs["buckets"].encode(buckets))
+        self.local.invalidate(f"product:{product_id}")
     
     def add_to_sorted_set(self, key: str, score: float, value: str):
         self.client.zadd(key, {value: score})
@@ -42,6 +151,45 @@ class RedisClient:
     def get_sorted_set_range(self, key: str, start: int = 0, end: int = -1) -> List[tuple]:
         return self.client.zrange(key, start, end, withscores=True)
     
+    @staticmethod
+    def price_index_key(product_id: str) -> str:
+        return f"product:{product_id}:price_index"
+    
+    def set_price_index(self, key: str, prices: List[float], ttl: int = None):
+        ttl = ttl or settings.REDIS_TTL
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(key)
+        if prices:
+            pipe.zadd(key, {str(i): price for i, price in enumerate(prices)})
+            pipe.expire(key, ttl)
+        pipe.execute()
+    
+    def count_cheaper(self, key: str, prices: List[float]) -> Optional[Tuple[int, List[int]]]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zcard(key)
+        for price in prices:
+            pipe.zcount(key, "-inf", f"({price}")
+        size, *counts = pipe.execute()
+        if not size:
+            return None
+        return size, counts
+    
+    def get_prices_at_positions(self, key: str, positions: List[int]) -> List[Optional[float]]:
+        pipe = self.client.pipeline(transaction=False)
+        for position in positions:
+            pipe.zrange(key, position - 1, position - 1, withscores=True)
+        return [
+            result[0][1] if result and position > 0 else None
+            for position, result in zip(positions, pipe.execute())
+        ]
+    
+    def touch_product_cache(self, product_id: str, ttl: int = None) -> bool:
+        ttl = ttl or settings.REDIS_TTL
+        pipe = self.client.pipeline(transaction=False)
+        for suffix in ("offers", "offers_count", "buckets", "price_index", "all_prices"):
+            pipe.expire(f"product:{product_id}:{suffix}", ttl)
+        return all(pipe.execute())
+    
     def delete_key(self, key: str):
         self.client.delete(key)
     
@@ -51,26 +199,195 @@ class RedisClient:
         if data:
             value.update(data)
         self.client.setex(key, 3600, json.dumps(value))
+        self.publish_invalidation(key)
     
     def get_job_status(self, job_id: str) -> Optional[Dict]:
         key = f"job:{job_id}"
+        cached = self.local.get(key, "status")
+        if cached is not MISSING:
+            return cached
+        
         data = self.client.get(key)
-        if data:
-            return json.loads(data)
-        return None
+        value = json.loads(data) if data else None
+        self.local.set(key, "status", value)
+        return value
     
     def set_all_prices(self, product_id: str, prices: List[float], ttl: int = None):
         key = f"product:{product_id}:all_prices"
         ttl = ttl or settings.REDIS_TTL
-        self.client.setex(key, ttl, json.dumps(prices))
+        self.raw.setex(key, ttl, self.codecs["prices"].encode(prices))
+        self.local.invalidate(f"product:{product_id}")
     
-    def get_all_prices(self, product_id: str) -> Optional[List[float]]:
-        key = f"product:{product_id}:all_prices"
-        data = self.client.get(key)
+    def get_all_prices(self, product_id: str) -> Optional[Sequence[float]]:
+        return self._cached_many("all_prices", [product_id], self._fetch_all_prices)[product_id]
+    
+    def _fetch_all_prices(self, product_ids: List[str]) -> Dict[str, Optional[Sequence[float]]]:
+        values = self.raw.mget([f"product:{product_id}:all_prices" for product_id in product_ids])
+        return {
+            product_id: self.decoders["prices"].decode(data) if data else None
+            for product_id, data in zip(product_ids, values)
+        }
+
+
+class AsyncRedisConnection:
+    def __init__(self):
+        self._client = None
+        self._raw = None
+        self._loop = None
+    
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._client = aioredis.from_url(
+                settings.REDIS_URL, decode_responses=True, max_connections=settings.REDIS_MAX_CONNECTIONS
+            )
+            self._raw = aioredis.from_url(
+                settings.REDIS_URL, decode_responses=False, max_connections=settings.REDIS_MAX_CONNECTIONS
+            )
+            self._loop = loop
+    
+    @property
+    def client(self) -> aioredis.Redis:
+        self._bind_loop()
+        return self._client
+    
+    @property
+    def raw(self) -> aioredis.Redis:
+        self._bind_loop()
+        return self._raw
+    
+    async def aclose(self):
+        for client in (self._client, self._raw):
+            if client is not None:
+                await client.aclose()
+        self._client = None
+        self._raw = None
+        self._loop = None
+
+
+class AsyncRedisClient:
+    def __init__(self, connection: AsyncRedisConnection, sync_client: RedisClient):
+        self.connection = connection
+        self.codecs = sync_client.codecs
+        self.decoders = sync_client.decoders
+        self.local = sync_client.local
+    
+    price_index_key = staticmethod(RedisClient.price_index_key)
+    
+    async def _cached_many(self, field: str, product_ids: List[str], suffix: str, decode: Callable) -> Dict:
+        result = {}
+        missing = []
+        for product_id in product_ids:
+            value = self.local.get(f"product:{product_id}", field)
+            if value is MISSING:
+                missing.append(product_id)
+            else:
+                result[product_id] = value
+        
+        if missing:
+            values = await self.connection.raw.mget([f"product:{product_id}:{suffix}" for product_id in missing])
+            for product_id, data in zip(missing, values):
+                value = decode(data) if data else None
+                self.local.set(f"product:{product_id}", field, value)
+                result[product_id] = value
+        return result
+    
+    async def get_product_offers(self, product_id: str) -> Optional[List[Dict]]:
+        return (await self.get_many_product_offers([product_id]))[product_id]
+    
+    async def get_many_product_offers(self, product_ids: List[str]) -> Dict[str, Optional[List[Dict]]]:
+        return await self._cached_many("offers", product_ids, "offers", self.decoders["offers"].decode)
+    
+    async def get_offer_counts(self, product_ids: List[str]) -> Dict[str, Optional[int]]:
+        counts = await self._cached_many("offers_count", product_ids, "offers_count", int)
+        missing = [product_id for product_id, count in counts.items() if count is None]
+        if missing:
+            for product_id, offers in (await self.get_many_product_offers(missing)).items():
+                if offers is not None:
+                    counts[product_id] = len(offers)
+        return counts
+    
+    async def get_price_buckets(self, product_id: str) -> Optional[Dict]:
+        return (await self.get_many_buckets([product_id]))[product_id]
+    
+    async def get_many_buckets(self, product_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        return await self._cached_many("buckets", product_ids, "buckets", self.decoders["buckets"].decode)
+    
+    async def get_all_prices(self, product_id: str) -> Optional[Sequence[float]]:
+        return (await self._cached_many("all_prices", [product_id], "all_prices", self.decoders["prices"].decode))[product_id]
+    
+    async def set_price_index(self, key: str, prices: List[float], ttl: int = None):
+        ttl = ttl or settings.REDIS_TTL
+        async with self.connection.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if prices:
+                pipe.zadd(key, {str(i): price for i, price in enumerate(prices)})
+                pipe.expire(key, ttl)
+            await pipe.execute()
+    
+    async def count_cheaper(self, key: str, prices: List[float]) -> Optional[Tuple[int, List[int]]]:
+        async with self.connection.client.pipeline(transaction=False) as pipe:
+            pipe.zcard(key)
+            for price in prices:
+                pipe.zcount(key, "-inf", f"({price}")
+            size, *counts = await pipe.execute()
+        if not size:
+            return None
+        return size, counts
+    
+    async def get_prices_at_positions(self, key: str, positions: List[int]) -> List[Optional[float]]:
+        async with self.connection.client.pipeline(transaction=False) as pipe:
+            for position in positions:
+                pipe.zrange(key, position - 1, position - 1, withscores=True)
+            results = await pipe.execute()
+        return [
+            result[0][1] if result and position > 0 else None
+            for position, result in zip(positions, results)
+        ]
+    
+    async def get(self, key: str) -> Optional[str]:
+        return await self.connection.client.get(key)
+    
+    async def setex(self, key: str, ttl: int, value: str):
+        await self.connection.client.setex(key, ttl, value)
+    
+    async def acquire_lock(self, key: str, token: str, ttl: int) -> bool:
+        return bool(await self.connection.client.set(key, token, nx=True, ex=ttl))
+    
+    async def release_lock(self, key: str, token: str):
+        await self.connection.client.eval(RELEASE_LOCK_SCRIPT, 1, key, token)
+    
+    async def delete_keys(self, *keys: str):
+        if keys:
+            await self.connection.client.delete(*keys)
+    
+    async def publish_invalidation(self, group: str):
+        self.local.invalidate(group)
+        await self.connection.client.publish(INVALIDATION_CHANNEL, group)
+    
+    async def set_job_status(self, job_id: str, status: str, data: Dict = None):
+        key = f"job:{job_id}"
+        value = {"status": status}
         if data:
-            return json.loads(data)
-        return None
+            value.update(data)
+        await self.connection.client.setex(key, 3600, json.dumps(value))
+        await self.publish_invalidation(key)
+    
+    async def get_job_status(self, job_id: str) -> Optional[Dict]:
+        key = f"job:{job_id}"
+        cached = self.local.get(key, "status")
+        if cached is not MISSING:
+            return cached
+        
+        data = await self.connection.client.get(key)
+        value = json.loads(data) if data else None
+        self.local.set(key, "status", value)
+        return value
+    
+    async def ping(self) -> bool:
+        return await self.connection.client.ping()
 
 
 redis_client = RedisClient()
-
+async_redis = AsyncRedisConnection()
+async_redis_client = AsyncRedisClient(async_redis, redis_client)
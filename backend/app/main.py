@@ -13,6 +13,8 @@ from app.core.exceptions import (
     general_exception_handler
 )
 from app.services.scheduler import start_scheduler, shutdown_scheduler
+from app.services.parser import client_pool
+from app.core.redis_client import redis_client, async_redis
 from slowapi.errors import RateLimitExceeded
 from slowapi import _rate_limit_exceeded_handler
 from sqlalchemy.exc import SQLAlchemyError
@@ -27,9 +29,13 @@ Base.metadata.create_all(bind=engine)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    redis_client.start_invalidation_listener()
     start_scheduler()
     yield
     shutdown_scheduler()
+    await client_pool.aclose()
+    await async_redis.aclose()
+    redis_client.stop_invalidation_listener()
 
 app = FastAPI(
     title="Kaspi Shop Panel API",
@@ -78,7 +84,7 @@ async def root():
 @app.get("/health")
 async def health():
     from app.core.database import SessionLocal
-    from app.core.redis_client import redis_client
+    from app.core.redis_client import async_redis_client
     from app.core.minio_client import minio_client
     from sqlalchemy.exc import SQLAlchemyError
     import redis.exceptions as redis_exceptions
@@ -109,7 +115,7 @@ async def health():
                 pass
     
     try:
-        redis_client.client.ping()
+        await async_redis_client.ping()
         checks["redis"]["status"] = True
     except redis_exceptions.ConnectionError as e:
         logger.error(f"Redis connection error: {e}")
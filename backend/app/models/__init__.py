@@ -1,5 +1,6 @@
-from app.models.product import Product, Seller, Offer, PriceHistory
-from app.models.analytics import AnalyticsDaily
+from app.models.product import Product, Seller, Offer, PriceHistory, ProductSnapshot
+from app.models.history import PriceHistoryHourly, PriceHistoryDaily
+from app.models.analytics import AnalyticsDaily, ProductStatsDaily, AnalyticsBackfillCheckpoint
 from app.models.job import ParsingJob
 from app.models.scheduler import SchedulerConfig
 
@@ -8,7 +9,12 @@ __all__ = [
     "Seller",
     "Offer",
     "PriceHistory",
+    "ProductSnapshot",
+    "PriceHistoryHourly",
+    "PriceHistoryDaily",
     "AnalyticsDaily",
+    "ProductStatsDaily",
+    "AnalyticsBackfillCheckpoint",
     "ParsingJob",
     "SchedulerConfig",
 ]
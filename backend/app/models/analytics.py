@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Date
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Date, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -6,6 +6,9 @@ from app.core.database import Base
 
 class AnalyticsDaily(Base):
     __tablename__ = "analytics_daily"
+    __table_args__ = (
+        UniqueConstraint("product_id", "date", name="uq_analytics_daily_product_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
@@ -38,3 +41,40 @@ class AnalyticsDaily(Base):
     
     product = relationship("Product")
 
+
+class ProductStatsDaily(Base):
+    __tablename__ = "product_stats_daily"
+    __table_args__ = (
+        UniqueConstraint("product_id", "date", name="uq_product_stats_daily_date"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    
+    samples = Column(Integer, default=0, nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+    price_sum = Column(Float, default=0, nullable=False)
+    mean = Column(Float, default=0, nullable=False)
+    m2 = Column(Float, default=0, nullable=False)
+    min_price = Column(Float)
+    max_price = Column(Float)
+    
+    updated_at = Column(DateTime(timezone=True))
+
+
+class AnalyticsBackfillCheckpoint(Base):
+    __tablename__ = "analytics_backfill_checkpoints"
+    __table_args__ = (
+        UniqueConstraint("start_date", "end_date", "first_product_id", "last_product_id", name="uq_analytics_backfill_chunk"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+    first_product_id = Column(Integer, nullable=False)
+    last_product_id = Column(Integer, nullable=False)
+    products_count = Column(Integer, default=0, nullable=False)
+    rows_written = Column(Integer, default=0, nullable=False)
+    planned_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True))
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+from app.core.database import Base
+
+
+class PriceHistoryHourly(Base):
+    __tablename__ = "price_history_hourly"
+    __table_args__ = (
+        UniqueConstraint("product_id", "seller_id", "bucket", name="uq_price_history_hourly_bucket"),
+        Index("ix_price_history_hourly_product_bucket", "product_id", "bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    seller_id = Column(Integer, ForeignKey("sellers.id"), nullable=False)
+    bucket = Column(DateTime(timezone=True), nullable=False)
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    last_price = Column(Float, nullable=False)
+    last_position = Column(Integer)
+    samples = Column(Integer, default=0, nullable=False)
+    
+    seller = relationship("Seller")
+
+
+class PriceHistoryDaily(Base):
+    __tablename__ = "price_history_daily"
+    __table_args__ = (
+        UniqueConstraint("product_id", "seller_id", "bucket", name="uq_price_history_daily_bucket"),
+        Index("ix_price_history_daily_product_bucket", "product_id", "bucket"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    seller_id = Column(Integer, ForeignKey("sellers.id"), nullable=False)
+    bucket = Column(DateTime(timezone=True), nullable=False)
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    last_price = Column(Float, nullable=False)
+    last_position = Column(Integer)
+    samples = Column(Integer, default=0, nullable=False)
+    
+    seller = relationship("Seller")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Index, Enum as SQLEnum
 from sqlalchemy.sql import func
 from app.core.database import Base
 import enum
@@ -13,6 +13,9 @@ class JobStatus(str, enum.Enum):
 
 class ParsingJob(Base):
     __tablename__ = "parsing_jobs"
+    __table_args__ = (
+        Index("ix_parsing_jobs_created_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     kaspi_url = Column(String, nullable=False)
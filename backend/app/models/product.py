@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Index, JSON, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -6,16 +6,32 @@ from app.core.database import Base
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_products_category_trgm", "category", postgresql_using="gin", postgresql_ops={"category": "gin_trgm_ops"}),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     kaspi_id = Column(String, unique=True, index=True, nullable=False)
     name = Column(String)
     category = Column(String)
+    offers_fingerprint = Column(String(40))
+    last_verified_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     offers = relationship("Offer", back_populates="product", cascade="all, delete-orphan")
     price_history = relationship("PriceHistory", back_populates="product", cascade="all, delete-orphan")
+    snapshot = relationship("ProductSnapshot", back_populates="product", uselist=False, cascade="all, delete-orphan")
+
+
+Index("ix_products_activity_id", func.coalesce(Product.updated_at, Product.created_at), Product.id)
+
+event.listen(
+    Product.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
 
 
 class Seller(Base):
@@ -47,16 +63,43 @@ class Offer(Base):
     seller = relationship("Seller", back_populates="offers")
 
 
+class ProductSnapshot(Base):
+    __tablename__ = "product_snapshots"
+    
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    prices = Column(JSON, nullable=False, default=list)
+    min_price = Column(Float)
+    max_price = Column(Float)
+    avg_price = Column(Float)
+    median_price = Column(Float)
+    p25_price = Column(Float)
+    p75_price = Column(Float)
+    price_std = Column(Float)
+    offers_count = Column(Integer, default=0, nullable=False)
+    sellers_count = Column(Integer, default=0, nullable=False)
+    in_stock_count = Column(Integer, default=0, nullable=False)
+    avg_seller_rating = Column(Float)
+    top_offers = Column(JSON, nullable=False, default=list)
+    price_buckets = Column(JSON)
+    fingerprint = Column(String(40))
+    parsed_at = Column(DateTime(timezone=True), nullable=False)
+    
+    product = relationship("Product", back_populates="snapshot")
+
+
 class PriceHistory(Base):
     __tablename__ = "price_history"
+    __table_args__ = (
+        Index("ix_price_history_product_recorded", "product_id", "recorded_at"),
+        Index("ix_price_history_seller_recorded", "seller_id", "recorded_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     seller_id = Column(Integer, ForeignKey("sellers.id"), nullable=False)
     price = Column(Float, nullable=False)
     position = Column(Integer)
-    recorded_at = Column(DateTime(timezone=True), server_default=func.now())
+    recorded_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     
     product = relationship("Product", back_populates="price_history")
     seller = relationship("Seller")
-
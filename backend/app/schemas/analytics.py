@@ -8,6 +8,8 @@ class PositionEstimate(BaseModel):
     estimated_position: int
     total_sellers: int
     percentile: float
+    data_age_seconds: Optional[float] = None
+    is_stale: bool = False
 
 
 class AnalyticsResponse(BaseModel):
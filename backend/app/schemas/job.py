@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from app.models.job import JobStatus
 
@@ -21,3 +21,8 @@ class JobResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+
+class JobPage(BaseModel):
+    items: List[JobResponse]
+    next_cursor: Optional[str] = None
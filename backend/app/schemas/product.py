@@ -43,6 +43,7 @@ class ProductResponse(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime]
     last_parsed_at: Optional[datetime] = None
+    last_verified_at: Optional[datetime] = None
     total_offers_count: Optional[int] = None
     
     @model_validator(mode='after')
@@ -57,6 +58,24 @@ class ProductResponse(BaseModel):
         from_attributes = True
 
 
+class ProductListItem(BaseModel):
+    id: int
+    kaspi_id: str
+    name: Optional[str]
+    category: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    last_verified_at: Optional[datetime] = None
+    total_offers_count: Optional[int] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+
+
+class ProductPage(BaseModel):
+    items: List[ProductListItem]
+    next_cursor: Optional[str] = None
+
+
 class ProductCreate(BaseModel):
     url: HttpUrl = Field(..., description="URL товара на Kaspi")
     
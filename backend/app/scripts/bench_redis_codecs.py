@@ -0,0 +1,48 @@
+from app.core.codecs import JsonCodec, PriceArrayCodec, OffersCodec
+import random
+import timeit
+import numpy as np
+
+ROUNDS = 200
+
+
+def make_offers(count: int):
+    return [
+        {
+            "price": round(random.uniform(10000, 900000), 2),
+            "seller_name": f"Продавец {i}",
+            "seller_rating": round(random.uniform(3.0, 5.0), 1),
+            "seller_reviews_count": random.randint(0, 50000),
+            "position": i + 1,
+            "in_stock": random.random() > 0.1
+        }
+        for i in range(count)
+    ]
+
+
+def bench(label: str, codec, value, consume=None):
+    encoded = codec.encode(value)
+    consume = consume or (lambda decoded: decoded)
+    seconds = timeit.timeit(lambda: consume(codec.decode(encoded)), number=ROUNDS) / ROUNDS
+    print(f"{label:<28} {len(encoded):>10} bytes {seconds * 1e6:>10.1f} us/decode")
+    return len(encoded), seconds
+
+
+def main():
+    for count in (64, 1000, 10000):
+        offers = make_offers(count)
+        prices = sorted(o["price"] for o in offers)
+        print(f"--- {count} offers ---")
+        
+        json_size, json_time = bench("prices json", JsonCodec(), prices)
+        bin_size, bin_time = bench("prices float64", PriceArrayCodec(), prices)
+        bench("prices float64 -> numpy", PriceArrayCodec(), prices, consume=lambda view: np.frombuffer(view, dtype="<f8"))
+        print(f"prices: {json_size / bin_size:.1f}x smaller, {json_time / bin_time:.1f}x faster decode")
+        
+        json_size, json_time = bench("offers json", JsonCodec(), offers)
+        bin_size, bin_time = bench("offers binary", OffersCodec(), offers)
+        print(f"offers: {json_size / bin_size:.1f}x smaller, {json_time / bin_time:.1f}x faster decode")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,190 @@
-from app.core.database import SessionLocal
+from app.core.database import SessionLocal, engine
 from app.models.product import Product, PriceHistory
-from app.models.analytics import AnalyticsDaily
-from app.services.analytics import AnalyticsService
-from datetime import date, timedelta
+from app.models.history import PriceHistoryDaily
+from app.models.analytics import AnalyticsBackfillCheckpoint
+from app.services.aggregation_service import AggregationService, MAX_PRODUCT_ID
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import List, Optional, Tuple
 from sqlalchemy import func
+from sqlalchemy.orm import Session
+import argparse
+import sys
+import time
 
-db = SessionLocal()
 
-try:
-    for product in db.query(Product).all():
-        try:
-            dates = db.query(func.date(PriceHistory.recorded_at)).filter(
-                PriceHistory.product_id == product.id
-            ).distinct().order_by(func.date(PriceHistory.recorded_at)).all()
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Backfill analytics_daily from price history")
+    parser.add_argument("--start", type=date.fromisoformat, help="First day, YYYY-MM-DD (default: earliest history)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last day, YYYY-MM-DD (default: latest history)")
+    parser.add_argument("--first-product", type=int, default=0, help="Lowest product id to include")
+    parser.add_argument("--last-product", type=int, default=MAX_PRODUCT_ID, help="Highest product id to include")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Products per chunk")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes")
+    parser.add_argument("--restart", action="store_true", help="Discard the saved plan and start over")
+    return parser.parse_args(argv)
+
+
+def history_bounds(db: Session) -> Tuple[Optional[date], Optional[date]]:
+    raw_first, raw_last = db.query(func.min(PriceHistory.recorded_at), func.max(PriceHistory.recorded_at)).one()
+    daily_first, daily_last = db.query(func.min(PriceHistoryDaily.bucket), func.max(PriceHistoryDaily.bucket)).one()
+    firsts = [value.date() for value in (raw_first, daily_first) if value]
+    lasts = [value.date() for value in (raw_last, daily_last) if value]
+    return (min(firsts) if firsts else None), (max(lasts) if lasts else None)
+
+
+def plan_chunks(db: Session, first_product: int, last_product: int, chunk_size: int) -> List[Tuple[int, int, int]]:
+    product_ids = [
+        product_id for (product_id,) in db.query(Product.id).filter(
+            Product.id.between(first_product, last_product)
+        ).order_by(Product.id)
+    ]
+    return [
+        (chunk[0], chunk[-1], len(chunk))
+        for chunk in (product_ids[i:i + chunk_size] for i in range(0, len(product_ids), chunk_size))
+    ]
+
+
+def find_plan(db: Session, args: argparse.Namespace) -> List[AnalyticsBackfillCheckpoint]:
+    query = db.query(AnalyticsBackfillCheckpoint).filter(
+        AnalyticsBackfillCheckpoint.first_product_id >= args.first_product,
+        AnalyticsBackfillCheckpoint.last_product_id <= args.last_product
+    )
+    if args.start:
+        query = query.filter(AnalyticsBackfillCheckpoint.start_date == args.start)
+    if args.end:
+        query = query.filter(AnalyticsBackfillCheckpoint.end_date == args.end)
+    if not args.start and not args.end:
+        query = query.filter(AnalyticsBackfillCheckpoint.completed_at.is_(None))
+    
+    latest = query.order_by(AnalyticsBackfillCheckpoint.planned_at.desc()).first()
+    if latest is None:
+        return []
+    return db.query(AnalyticsBackfillCheckpoint).filter(
+        AnalyticsBackfillCheckpoint.start_date == latest.start_date,
+        AnalyticsBackfillCheckpoint.end_date == latest.end_date,
+        AnalyticsBackfillCheckpoint.planned_at == latest.planned_at
+    ).order_by(AnalyticsBackfillCheckpoint.first_product_id).all()
+
+
+def save_plan(db: Session, start_date: date, end_date: date, chunks: List[Tuple[int, int, int]]) -> List[AnalyticsBackfillCheckpoint]:
+    db.query(AnalyticsBackfillCheckpoint).filter(
+        AnalyticsBackfillCheckpoint.start_date == start_date,
+        AnalyticsBackfillCheckpoint.end_date == end_date
+    ).delete(synchronize_session=False)
+    
+    planned_at = datetime.utcnow()
+    plan = [
+        AnalyticsBackfillCheckpoint(
+            start_date=start_date,
+            end_date=end_date,
+            first_product_id=first_id,
+            last_product_id=last_id,
+            products_count=size,
+            planned_at=planned_at
+        )
+        for first_id, last_id, size in chunks
+    ]
+    db.add_all(plan)
+    db.commit()
+    return plan
+
+
+def init_worker():
+    engine.dispose(close=False)
+
+
+def run_chunk(checkpoint_id: int, start_date: date, end_date: date, first_id: int, last_id: int) -> int:
+    db = SessionLocal()
+    try:
+        written = AggregationService.backfill_history(db, start_date, end_date, first_id, last_id)
+        
+        db.query(AnalyticsBackfillCheckpoint).filter(
+            AnalyticsBackfillCheckpoint.id == checkpoint_id
+        ).update({"rows_written": written, "completed_at": datetime.utcnow()}, synchronize_session=False)
+        db.commit()
+        return written
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    
+    db = SessionLocal()
+    try:
+        if not AggregationService.is_supported(db):
+            print("Analytics backfill requires PostgreSQL")
+            return 1
+        
+        plan = [] if args.restart else find_plan(db, args)
+        if plan:
+            start_date, end_date = plan[0].start_date, plan[0].end_date
+            print(f"Resuming plan from {plan[0].planned_at:%Y-%m-%d %H:%M:%S}")
+        else:
+            history_start, history_end = history_bounds(db)
+            start_date = args.start or history_start
+            end_date = args.end or history_end
+            if start_date is None or end_date is None:
+                print("No price history to backfill")
+                return 0
             
-            for (record_date,) in dates:
-                history_records = db.query(PriceHistory).filter(
-                    PriceHistory.product_id == product.id,
-                    func.date(PriceHistory.recorded_at) == record_date
-                ).all()
-                
-                if history_records:
-                    offers_data = [{"price": r.price} for r in history_records]
-                    stats = AnalyticsService.calculate_statistics(offers_data)
-                    
-                    if stats["min_price"] is None:
-                        continue
-                    
-                    sorted_prices = sorted([r.price for r in history_records])
-                    
-                    price_pos_1 = sorted_prices[0] if sorted_prices else None
-                    price_pos_3 = sorted_prices[2] if len(sorted_prices) > 2 else None
-                    price_pos_5 = sorted_prices[4] if len(sorted_prices) > 4 else None
-                    price_pos_10 = sorted_prices[9] if len(sorted_prices) > 9 else None
-                    
-                    previous_day = db.query(AnalyticsDaily).filter(
-                        AnalyticsDaily.product_id == product.id,
-                        AnalyticsDaily.date < record_date
-                    ).order_by(AnalyticsDaily.date.desc()).first()
-                    
-                    delta_price = None
-                    delta_percent = None
-                    sellers_delta = 0
-                    
-                    if previous_day and previous_day.avg_price and stats["avg_price"]:
-                        delta_price = stats["avg_price"] - previous_day.avg_price
-                        delta_percent = (delta_price / previous_day.avg_price * 100) if previous_day.avg_price > 0 else 0
-                    
-                    current_sellers = len(set(r.seller_id for r in history_records))
-                    if previous_day and previous_day.sellers_count:
-                        sellers_delta = current_sellers - previous_day.sellers_count
-                    
-                    existing = db.query(AnalyticsDaily).filter(
-                        AnalyticsDaily.product_id == product.id,
-                        AnalyticsDaily.date == record_date
-                    ).first()
-                    
-                    if not existing:
-                        analytics = AnalyticsDaily(
-                            product_id=product.id,
-                            date=record_date,
-                            min_price=stats["min_price"],
-                            max_price=stats["max_price"],
-                            avg_price=stats["avg_price"],
-                            median_price=stats["median_price"],
-                            price_std=stats["price_std"] or 0,
-                            offers_count=len(history_records),
-                            sellers_count=current_sellers,
-                            top_sellers_count=len(history_records),
-                            estimated_total_sellers=len(history_records) * 4,
-                            price_position_1=price_pos_1,
-                            price_position_3=price_pos_3,
-                            price_position_5=price_pos_5,
-                            price_position_10=price_pos_10,
-                            avg_seller_rating=None,
-                            in_stock_count=len(history_records),
-                            delta_price=delta_price,
-                            delta_percent=delta_percent,
-                            sellers_delta=sellers_delta
-                        )
-                        db.add(analytics)
+            chunks = plan_chunks(db, args.first_product, args.last_product, args.chunk_size)
+            plan = save_plan(db, start_date, end_date, chunks)
+        
+        pending = [
+            (checkpoint.id, checkpoint.first_product_id, checkpoint.last_product_id, checkpoint.products_count)
+            for checkpoint in plan if checkpoint.completed_at is None
+        ]
+        planned = len(plan)
+    finally:
+        db.close()
+    
+    total_products = sum(size for _, _, _, size in pending)
+    print(
+        f"Backfilling {start_date}..{end_date}: {len(pending)} chunks, {total_products} products "
+        f"({planned - len(pending)} chunks already done), {args.workers} workers"
+    )
+    if not pending:
+        return 0
+    
+    sizes = {checkpoint_id: size for checkpoint_id, _, _, size in pending}
+    started = time.monotonic()
+    products_done = 0
+    rows_done = 0
+    failed = 0
+    
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker) as pool:
+        futures = {
+            pool.submit(run_chunk, checkpoint_id, start_date, end_date, first_id, last_id): (checkpoint_id, first_id, last_id)
+            for checkpoint_id, first_id, last_id, _ in pending
+        }
+        for completed, future in enumerate(as_completed(futures), start=1):
+            checkpoint_id, first_id, last_id = futures[future]
+            try:
+                written = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[{completed}/{len(pending)}] products {first_id}-{last_id} failed: {e}")
+                continue
             
-            db.commit()
-            print(f"Processed product {product.id}")
-        except Exception as e:
-            print(f"Error processing product {product.id}: {e}")
-            db.rollback()
-            continue
-except Exception as e:
-    print(f"Error: {e}")
-    db.rollback()
-finally:
-    db.close()
+            products_done += sizes[checkpoint_id]
+            rows_done += written
+            elapsed = max(time.monotonic() - started, 1e-6)
+            rate = products_done / elapsed
+            eta = (total_products - products_done) / rate if rate > 0 else 0
+            print(
+                f"[{completed}/{len(pending)}] products {first_id}-{last_id}: {written} rows | "
+                f"{rate:.1f} products/s, {rows_done / elapsed:.1f} rows/s, ETA {eta:.0f}s"
+            )
+    
+    elapsed = time.monotonic() - started
+    print(f"Analytics backfill finished in {elapsed:.1f}s: {rows_done} rows, {products_done} products, {failed} failed chunks")
+    return 1 if failed else 0
+
 
+if __name__ == "__main__":
+    sys.exit(main())
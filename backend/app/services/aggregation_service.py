@@ -0,0 +1,224 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from datetime import date, datetime, time, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_PRODUCT_ID = 2 ** 31 - 1
+
+DAILY_AGGREGATION_SQL = """
+WITH offer_stats AS (
+    SELECT o.product_id,
+           min(o.price) FILTER (WHERE o.price > 0) AS min_price,
+           max(o.price) FILTER (WHERE o.price > 0) AS max_price,
+           avg(o.price) FILTER (WHERE o.price > 0) AS avg_price,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY o.price) FILTER (WHERE o.price > 0) AS median_price,
+           stddev_samp(o.price) FILTER (WHERE o.price > 0) AS price_std,
+           count(*) AS offers_count,
+           count(DISTINCT s.name) FILTER (WHERE s.name <> '') AS unique_sellers,
+           avg(s.rating) FILTER (WHERE s.rating > 0) AS avg_seller_rating,
+           count(*) FILTER (WHERE o.in_stock) AS in_stock_count,
+           array_agg(o.price ORDER BY o.price) FILTER (WHERE o.price > 0) AS prices
+    FROM offers o
+    LEFT JOIN sellers s ON s.id = o.seller_id
+    WHERE o.product_id BETWEEN :first_id AND :last_id
+    GROUP BY o.product_id
+),
+current_day AS (
+    SELECT os.product_id,
+           coalesce(acc.min_price, os.min_price) AS min_price,
+           coalesce(acc.max_price, os.max_price) AS max_price,
+           CASE WHEN acc.count > 0 THEN acc.mean ELSE os.avg_price END AS avg_price,
+           os.median_price,
+           CASE
+               WHEN acc.count > 1 THEN sqrt(acc.m2 / (acc.count - 1))
+               WHEN acc.count = 1 THEN 0
+               ELSE coalesce(os.price_std, 0)
+           END AS price_std,
+           os.offers_count,
+           coalesce((ps.price_buckets ->> 'total_sellers_count')::int, nullif(os.unique_sellers, 0), os.offers_count) AS sellers_count,
+           coalesce((ps.price_buckets ->> 'top_sellers_count')::int, os.offers_count) AS top_sellers_count,
+           coalesce((ps.price_buckets ->> 'total_sellers_count')::int, os.offers_count * 4) AS estimated_total_sellers,
+           os.prices[1] AS price_position_1,
+           os.prices[3] AS price_position_3,
+           os.prices[5] AS price_position_5,
+           os.prices[10] AS price_position_10,
+           os.avg_seller_rating,
+           os.in_stock_count
+    FROM offer_stats os
+    LEFT JOIN product_stats_daily acc ON acc.product_id = os.product_id AND acc.date = :day
+    LEFT JOIN product_snapshots ps ON ps.product_id = os.product_id
+)
+INSERT INTO analytics_daily
+    (product_id, date, min_price, max_price, avg_price, median_price, price_std,
+     offers_count, sellers_count, top_sellers_count, estimated_total_sellers,
+     price_position_1, price_position_3, price_position_5, price_position_10,
+     avg_seller_rating, in_stock_count, delta_price, delta_percent, sellers_delta)
+SELECT c.product_id, :day, c.min_price, c.max_price, c.avg_price, c.median_price, c.price_std,
+       c.offers_count, c.sellers_count, c.top_sellers_count, c.estimated_total_sellers,
+       c.price_position_1, c.price_position_3, c.price_position_5, c.price_position_10,
+       c.avg_seller_rating, c.in_stock_count,
+       CASE WHEN p.avg_price <> 0 AND c.avg_price <> 0 THEN c.avg_price - p.avg_price END,
+       CASE
+           WHEN p.avg_price > 0 AND c.avg_price <> 0 THEN (c.avg_price - p.avg_price) / p.avg_price * 100
+           WHEN p.avg_price <> 0 AND c.avg_price <> 0 THEN 0
+       END,
+       CASE WHEN p.sellers_count <> 0 THEN c.sellers_count - p.sellers_count ELSE 0 END
+FROM current_day c
+LEFT JOIN LATERAL (
+    SELECT ad.avg_price, ad.sellers_count
+    FROM analytics_daily ad
+    WHERE ad.product_id = c.product_id AND ad.date < :day
+    ORDER BY ad.date DESC
+    LIMIT 1
+) p ON true
+ON CONFLICT (product_id, date) DO UPDATE SET
+    min_price = EXCLUDED.min_price,
+    max_price = EXCLUDED.max_price,
+    avg_price = EXCLUDED.avg_price,
+    median_price = EXCLUDED.median_price,
+    price_std = EXCLUDED.price_std,
+    offers_count = EXCLUDED.offers_count,
+    sellers_count = EXCLUDED.sellers_count,
+    top_sellers_count = EXCLUDED.top_sellers_count,
+    estimated_total_sellers = EXCLUDED.estimated_total_sellers,
+    price_position_1 = EXCLUDED.price_position_1,
+    price_position_3 = EXCLUDED.price_position_3,
+    price_position_5 = EXCLUDED.price_position_5,
+    price_position_10 = EXCLUDED.price_position_10,
+    avg_seller_rating = EXCLUDED.avg_seller_rating,
+    in_stock_count = EXCLUDED.in_stock_count,
+    delta_price = EXCLUDED.delta_price,
+    delta_percent = EXCLUDED.delta_percent,
+    sellers_delta = EXCLUDED.sellers_delta
+"""
+
+HISTORY_BACKFILL_SQL = """
+WITH raw_stats AS (
+    SELECT product_id,
+           recorded_at::date AS day,
+           min(price) FILTER (WHERE price > 0) AS min_price,
+           max(price) FILTER (WHERE price > 0) AS max_price,
+           avg(price) FILTER (WHERE price > 0) AS avg_price,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY price) FILTER (WHERE price > 0) AS median_price,
+           coalesce(stddev_samp(price) FILTER (WHERE price > 0), 0) AS price_std,
+           count(*) AS records_count,
+           count(DISTINCT seller_id) AS sellers_count,
+           array_agg(price ORDER BY price) AS prices
+    FROM price_history
+    WHERE product_id BETWEEN :first_id AND :last_id
+      AND recorded_at >= :start AND recorded_at < :end
+    GROUP BY product_id, recorded_at::date
+    HAVING count(*) FILTER (WHERE price > 0) > 0
+),
+raw_bounds AS (
+    SELECT product_id, min(recorded_at)::date + 1 AS complete_from
+    FROM price_history
+    WHERE product_id BETWEEN :first_id AND :last_id
+    GROUP BY product_id
+),
+rollup_stats AS (
+    SELECT d.product_id,
+           d.bucket::date AS day,
+           min(d.min_price) FILTER (WHERE d.last_price > 0) AS min_price,
+           max(d.max_price) FILTER (WHERE d.last_price > 0) AS max_price,
+           avg(d.last_price) FILTER (WHERE d.last_price > 0) AS avg_price,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY d.last_price) FILTER (WHERE d.last_price > 0) AS median_price,
+           coalesce(stddev_samp(d.last_price) FILTER (WHERE d.last_price > 0), 0) AS price_std,
+           sum(d.samples) AS records_count,
+           count(DISTINCT d.seller_id) AS sellers_count,
+           array_agg(d.last_price ORDER BY d.last_price) AS prices
+    FROM price_history_daily d
+    LEFT JOIN raw_bounds b ON b.product_id = d.product_id
+    WHERE d.product_id BETWEEN :first_id AND :last_id
+      AND d.bucket >= :start AND d.bucket < :end
+      AND d.bucket::date < coalesce(b.complete_from, 'infinity'::date)
+    GROUP BY d.product_id, d.bucket::date
+    HAVING count(*) FILTER (WHERE d.last_price > 0) > 0
+),
+day_stats AS (
+    SELECT * FROM rollup_stats
+    UNION ALL
+    SELECT * FROM raw_stats r
+    WHERE NOT EXISTS (SELECT 1 FROM rollup_stats u WHERE u.product_id = r.product_id AND u.day = r.day)
+),
+existing AS (
+    SELECT product_id, date AS day, avg_price, sellers_count
+    FROM analytics_daily
+    WHERE product_id BETWEEN :first_id AND :last_id
+      AND date BETWEEN :start_date AND :end_date
+),
+before_start AS (
+    SELECT DISTINCT ON (product_id) product_id, date AS day, avg_price, sellers_count
+    FROM analytics_daily
+    WHERE product_id BETWEEN :first_id AND :last_id AND date < :start_date
+    ORDER BY product_id, date DESC
+),
+timeline AS (
+    SELECT d.product_id, d.day, d.avg_price, d.sellers_count, true AS is_new
+    FROM day_stats d
+    WHERE NOT EXISTS (SELECT 1 FROM existing e WHERE e.product_id = d.product_id AND e.day = d.day)
+    UNION ALL
+    SELECT product_id, day, avg_price, sellers_count, false FROM existing
+    UNION ALL
+    SELECT product_id, day, avg_price, sellers_count, false FROM before_start
+),
+previous AS (
+    SELECT product_id, day, is_new,
+           lag(avg_price) OVER w AS avg_price,
+           lag(sellers_count) OVER w AS sellers_count
+    FROM timeline
+    WINDOW w AS (PARTITION BY product_id ORDER BY day)
+)
+INSERT INTO analytics_daily
+    (product_id, date, min_price, max_price, avg_price, median_price, price_std,
+     offers_count, sellers_count, top_sellers_count, estimated_total_sellers,
+     price_position_1, price_position_3, price_position_5, price_position_10,
+     avg_seller_rating, in_stock_count, delta_price, delta_percent, sellers_delta)
+SELECT d.product_id, d.day, d.min_price, d.max_price, d.avg_price, d.median_price, d.price_std,
+       d.records_count, d.sellers_count, d.records_count, d.records_count * 4,
+       d.prices[1], d.prices[3], d.prices[5], d.prices[10],
+       NULL, d.records_count,
+       CASE WHEN p.avg_price <> 0 AND d.avg_price <> 0 THEN d.avg_price - p.avg_price END,
+       CASE
+           WHEN p.avg_price > 0 AND d.avg_price <> 0 THEN (d.avg_price - p.avg_price) / p.avg_price * 100
+           WHEN p.avg_price <> 0 AND d.avg_price <> 0 THEN 0
+       END,
+       CASE WHEN p.sellers_count <> 0 THEN d.sellers_count - p.sellers_count ELSE 0 END
+FROM day_stats d
+JOIN previous p ON p.product_id = d.product_id AND p.day = d.day AND p.is_new
+ON CONFLICT (product_id, date) DO NOTHING
+"""
+
+
+class AggregationService:
+    @staticmethod
+    def is_supported(db: Session) -> bool:
+        return db.get_bind().dialect.name == "postgresql"
+    
+    @staticmethod
+    def aggregate_daily(db: Session, day: date, first_id: int = 0, last_id: int = MAX_PRODUCT_ID) -> int:
+        written = db.execute(
+            text(DAILY_AGGREGATION_SQL),
+            {"day": day, "first_id": first_id, "last_id": last_id}
+        ).rowcount
+        db.commit()
+        logger.info(f"Daily analytics for {day}: {written} products aggregated")
+        return written
+    
+    @staticmethod
+    def backfill_history(db: Session, start_date: date, end_date: date, first_id: int, last_id: int) -> int:
+        written = db.execute(
+            text(HISTORY_BACKFILL_SQL),
+            {
+                "start": datetime.combine(start_date, time.min),
+                "end": datetime.combine(end_date + timedelta(days=1), time.min),
+                "start_date": start_date,
+                "end_date": end_date,
+                "first_id": first_id,
+                "last_id": last_id
+            }
+        ).rowcount
+        db.commit()
+        return written
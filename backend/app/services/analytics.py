@@ -1,10 +1,13 @@
-from typing import List, Dict, Optional
-from app.core.redis_client import redis_client
+from typing import List, Dict, Optional, Sequence, Tuple
+from app.core.redis_client import redis_client, async_redis_client
 from app.schemas.analytics import PositionEstimate
 import statistics
-import math
 from datetime import datetime, timedelta
 from collections import defaultdict
+from bisect import bisect_left
+import numpy as np
+
+DEFAULT_RANK_WEIGHTS = {"price": 0.5, "rating": 0.3, "reviews": 0.2}
 
 
 class AnalyticsService:
@@ -14,55 +17,83 @@ class AnalyticsService:
         user_price: float,
         offers: List[Dict]
     ) -> PositionEstimate:
-        all_prices = redis_client.get_all_prices(product_id)
-        
-        if all_prices and len(all_prices) > 0:
+        return AnalyticsService.calculate_position_estimates(product_id, [user_price], offers)[0]
+    
+    @staticmethod
+    def calculate_position_estimates(
+        product_id: str,
+        user_prices: List[float],
+        offers: List[Dict]
+    ) -> List[PositionEstimate]:
+        buckets = redis_client.get_price_buckets(product_id)
+        indexed = redis_client.count_cheaper(redis_client.price_index_key(product_id), user_prices)
+        all_prices = redis_client.get_all_prices(product_id) if indexed is None else None
+        return AnalyticsService._position_estimates(user_prices, offers, buckets, indexed, all_prices)
+    
+    @staticmethod
+    async def calculate_position_estimate_async(
+        product_id: str,
+        user_price: float,
+        offers: List[Dict]
+    ) -> PositionEstimate:
+        return (await AnalyticsService.calculate_position_estimates_async(product_id, [user_price], offers))[0]
+    
+    @staticmethod
+    async def calculate_position_estimates_async(
+        product_id: str,
+        user_prices: List[float],
+        offers: List[Dict]
+    ) -> List[PositionEstimate]:
+        buckets = await async_redis_client.get_price_buckets(product_id)
+        indexed = await async_redis_client.count_cheaper(redis_client.price_index_key(product_id), user_prices)
+        all_prices = await async_redis_client.get_all_prices(product_id) if indexed is None else None
+        return AnalyticsService._position_estimates(user_prices, offers, buckets, indexed, all_prices)
+    
+    @staticmethod
+    def _position_estimates(
+        user_prices: List[float],
+        offers: List[Dict],
+        buckets: Optional[Dict],
+        indexed: Optional[Tuple[int, List[int]]],
+        all_prices: Optional[Sequence[float]]
+    ) -> List[PositionEstimate]:
+        if indexed is None and all_prices is not None and len(all_prices) > 0:
             sorted_prices = sorted(all_prices)
-            cheaper_count = sum(1 for price in sorted_prices if price < user_price)
-            
-            if user_price < sorted_prices[0]:
-                position = 1
-            elif user_price > sorted_prices[-1]:
-                position = len(sorted_prices) + 1
-            else:
-                position = cheaper_count + 1
-            
-            buckets = redis_client.get_price_buckets(product_id)
-            parsed_count = len(sorted_prices)
-            
-            if buckets and buckets.get("total_sellers_count"):
-                total_sellers_from_api = int(buckets["total_sellers_count"])
-                print(f"Position calculation: user_price={user_price}, position={position}, parsed_count={parsed_count}, total_sellers_from_api={total_sellers_from_api}")
-                
-                total_sellers = max(total_sellers_from_api, parsed_count, position)
-            else:
-                total_sellers = max(parsed_count, position)
-                print(f"Position calculation: No total_sellers_count in buckets, using max(parsed_count={parsed_count}, position={position})")
-            
-            print(f"Final total_sellers: {total_sellers}")
-            
-            percentile = ((total_sellers - position + 1) / total_sellers * 100) if total_sellers > 0 else 0
-            percentile = max(0, min(100, percentile))
-            
-            print(f"Final: position={position}, total_sellers={total_sellers}, percentile={percentile:.2f}%")
-            
-            return PositionEstimate(
-                user_price=user_price,
-                estimated_position=position,
-                total_sellers=total_sellers,
-                percentile=percentile
-            )
+            indexed = (len(sorted_prices), [bisect_left(sorted_prices, price) for price in user_prices])
+        
+        if indexed is not None:
+            parsed_count, cheaper_counts = indexed
+            return [
+                AnalyticsService._indexed_position(user_price, cheaper_count + 1, parsed_count, buckets)
+                for user_price, cheaper_count in zip(user_prices, cheaper_counts)
+            ]
+        
+        prices = sorted(o["price"] for o in offers if o.get("price") is not None) if offers else []
+        return [
+            AnalyticsService._estimate_from_offers(user_price, prices, buckets)
+            for user_price in user_prices
+        ]
+    
+    @staticmethod
+    def _indexed_position(user_price: float, position: int, parsed_count: int, buckets: Optional[Dict]) -> PositionEstimate:
+        if buckets and buckets.get("total_sellers_count"):
+            total_sellers = max(int(buckets["total_sellers_count"]), parsed_count, position)
+        else:
+            total_sellers = max(parsed_count, position)
         
-        if not offers:
-            return PositionEstimate(
-                user_price=user_price,
-                estimated_position=1,
-                total_sellers=1,
-                percentile=0
-            )
+        percentile = ((total_sellers - position + 1) / total_sellers * 100) if total_sellers > 0 else 0
+        percentile = max(0, min(100, percentile))
         
-        valid_offers = [o for o in offers if o.get("price") is not None]
-        if not valid_offers:
+        return PositionEstimate(
+            user_price=user_price,
+            estimated_position=position,
+            total_sellers=total_sellers,
+            percentile=percentile
+        )
+    
+    @staticmethod
+    def _estimate_from_offers(user_price: float, prices: List[float], buckets: Optional[Dict]) -> PositionEstimate:
+        if not prices:
             return PositionEstimate(
                 user_price=user_price,
                 estimated_position=1,
@@ -70,13 +101,10 @@ class AnalyticsService:
                 percentile=0
             )
         
-        sorted_offers = sorted(valid_offers, key=lambda x: x["price"])
-        prices = [o["price"] for o in sorted_offers]
         min_price = prices[0]
         max_price = prices[-1]
-        parsed_count = len(sorted_offers)
+        parsed_count = len(prices)
         
-        buckets = redis_client.get_price_buckets(product_id)
         total_sellers = buckets.get("total_sellers_count") if buckets else None
         
         if not total_sellers or total_sellers < parsed_count:
@@ -93,13 +121,7 @@ class AnalyticsService:
             else:
                 position = total_sellers
         else:
-            cheaper_count = sum(1 for price in prices if price < user_price)
-            equal_count = sum(1 for price in prices if price == user_price)
-            
-            if equal_count > 0:
-                position_in_parsed = cheaper_count + 1
-            else:
-                position_in_parsed = cheaper_count + 1
+            position_in_parsed = bisect_left(prices, user_price) + 1
             
             if total_sellers > parsed_count:
                 position_ratio = (position_in_parsed - 1) / parsed_count
@@ -227,54 +249,131 @@ class AnalyticsService:
         }
 
     @staticmethod
-    def calculate_weighted_rank(offers: List[Dict], user_price: float = None, user_rating: float = None) -> Dict:
+    def calculate_weighted_rank(
+        offers: List[Dict],
+        user_price: float = None,
+        user_rating: float = None,
+        weights: Optional[Dict[str, float]] = None,
+        user_prices: Optional[List[float]] = None
+    ) -> Dict:
         if not offers:
             return {}
         
-        w1, w2, w3 = 0.5, 0.3, 0.2
-        
-        scores = []
-        for offer in offers:
-            price = offer.get("price", 0)
-            rating = offer.get("seller_rating", 0) or 0
-            reviews = offer.get("seller_reviews_count", 0) or 0
-            
-            prices = sorted([o.get("price", 0) for o in offers])
-            price_rank = prices.index(price) + 1 if price in prices else len(prices)
-            
-            normalized_price_rank = price_rank / len(prices) if prices else 0
-            normalized_rating = (5 - rating) / 5 if rating > 0 else 1
-            normalized_reviews = math.log(reviews + 1) / 10 if reviews > 0 else 0
-            
-            score = (
-                normalized_price_rank * w1 +
-                normalized_rating * w2 +
-                normalized_reviews * w3
-            )
-            
-            scores.append({
-                "seller_name": offer.get("seller_name", ""),
-                "price": price,
-                "rating": rating,
-                "reviews": reviews,
-                "score": score,
-                "price_rank": price_rank
-            })
-        
-        scores.sort(key=lambda x: x["score"])
+        weights = {**DEFAULT_RANK_WEIGHTS, **(weights or {})}
+        w1, w2, w3 = weights["price"], weights["rating"], weights["reviews"]
+        
+        prices = np.array([offer.get("price", 0) for offer in offers], dtype=np.float64)
+        ratings = np.array([offer.get("seller_rating", 0) or 0 for offer in offers], dtype=np.float64)
+        reviews = np.array([offer.get("seller_reviews_count", 0) or 0 for offer in offers], dtype=np.float64)
+        
+        sorted_prices = np.sort(prices)
+        n = len(sorted_prices)
+        price_ranks = np.searchsorted(sorted_prices, prices, side="left") + 1
+        
+        normalized_rating = np.where(ratings > 0, (5 - ratings) / 5, 1)
+        normalized_reviews = np.where(reviews > 0, np.log(reviews + 1) / 10, 0)
+        rating_scores = normalized_rating * w2
+        reviews_scores = normalized_reviews * w3
+        offer_scores = price_ranks / n * w1 + rating_scores + reviews_scores
+        
+        order = np.argsort(offer_scores, kind="stable")
+        scores = [
+            {
+                "seller_name": offers[i].get("seller_name", ""),
+                "price": offers[i].get("price", 0),
+                "rating": offers[i].get("seller_rating", 0) or 0,
+                "reviews": offers[i].get("seller_reviews_count", 0) or 0,
+                "score": float(offer_scores[i]),
+                "price_rank": int(price_ranks[i])
+            }
+            for i in order
+        ]
         
-        user_score = None
+        candidates = list(user_prices or [])
         if user_price is not None:
-            user_normalized_rank = 0.5
-            user_normalized_rating = (5 - (user_rating or 3)) / 5
-            user_score = user_normalized_rank * w1 + user_normalized_rating * w2
+            candidates.insert(0, user_price)
+        ranked = AnalyticsService._rank_user_prices(
+            sorted_prices, prices, price_ranks, rating_scores, reviews_scores, candidates, user_rating, w1, w2
+        )
         
-        return {
+        result = {
             "scores": scores,
-            "user_score": user_score,
-            "user_rank": None
+            "user_score": ranked[0]["user_score"] if user_price is not None else None,
+            "user_rank": ranked[0]["user_rank"] if user_price is not None else None,
+            "weights": weights
         }
-
+        if user_prices:
+            result["candidates"] = ranked[1:] if user_price is not None else ranked
+        return result
+    
+    @staticmethod
+    def _rank_user_prices(
+        sorted_prices: np.ndarray,
+        prices: np.ndarray,
+        price_ranks: np.ndarray,
+        rating_scores: np.ndarray,
+        reviews_scores: np.ndarray,
+        user_prices: List[float],
+        user_rating: Optional[float],
+        w1: float,
+        w2: float
+    ) -> List[Dict]:
+        if not user_prices:
+            return []
+        
+        candidates = np.asarray(user_prices, dtype=np.float64)
+        market_size = len(sorted_prices) + 1
+        user_ranks = np.searchsorted(sorted_prices, candidates, side="left") + 1
+        user_scores = user_ranks / market_size * w1 + (5 - (user_rating or 3)) / 5 * w2
+        
+        # Offers priced above a candidate move down one place once the user joins the market.
+        stay_scores = price_ranks / market_size * w1 + rating_scores + reviews_scores
+        shifted_scores = (price_ranks + 1) / market_size * w1 + rating_scores + reviews_scores
+        by_price = np.argsort(prices, kind="stable")
+        splits = np.searchsorted(sorted_prices, candidates, side="right")
+        
+        cheaper_below = AnalyticsService._prefix_counts_below(stay_scores[by_price], splits, user_scores)
+        shifted_below = AnalyticsService._prefix_counts_below(shifted_scores[by_price], splits, user_scores)
+        all_shifted_below = np.searchsorted(np.sort(shifted_scores), user_scores, side="left")
+        user_rank = cheaper_below + all_shifted_below - shifted_below + 1
+        
+        return [
+            {
+                "user_price": float(candidates[i]),
+                "price_rank": int(user_ranks[i]),
+                "user_score": float(user_scores[i]),
+                "user_rank": int(user_rank[i]),
+                "total": market_size
+            }
+            for i in range(len(candidates))
+        ]
+    
+    @staticmethod
+    def _prefix_counts_below(values: np.ndarray, splits: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+        # Fenwick tree over values[:splits[q]], filled in split order; counts values below thresholds[q].
+        distinct = np.unique(values)
+        slots = np.searchsorted(distinct, values) + 1
+        limits = np.searchsorted(distinct, thresholds, side="left")
+        tree = [0] * (len(distinct) + 1)
+        counts = np.zeros(len(splits), dtype=np.int64)
+        added = 0
+        
+        for q in np.argsort(splits, kind="stable"):
+            while added < splits[q]:
+                i = int(slots[added])
+                while i < len(tree):
+                    tree[i] += 1
+                    i += i & -i
+                added += 1
+            
+            total = 0
+            i = int(limits[q])
+            while i > 0:
+                total += tree[i]
+                i -= i & -i
+            counts[q] = total
+        return counts
+    
     @staticmethod
     def detect_dominant_sellers(offers: List[Dict], price_history: List[Dict] = None) -> List[Dict]:
         if not offers:
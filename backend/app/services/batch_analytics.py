@@ -0,0 +1,415 @@
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+
+def _offsets(counts: Sequence[int]) -> np.ndarray:
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _segment_ids(offsets: np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def _segment_sum(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    return np.bincount(_segment_ids(offsets), weights=values, minlength=len(offsets) - 1)
+
+
+def _compact(offsets: np.ndarray, mask: np.ndarray, *columns: np.ndarray):
+    counts = np.bincount(_segment_ids(offsets), weights=mask, minlength=len(offsets) - 1).astype(np.int64)
+    return (_offsets(counts),) + tuple(column[mask] for column in columns)
+
+
+def _sort_segments(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    return values[np.lexsort((values, _segment_ids(offsets)))]
+
+
+def _take(values: np.ndarray, offsets: np.ndarray, index: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    result = np.full(len(offsets) - 1, np.nan)
+    result[valid] = values[offsets[:-1][valid] + index[valid]]
+    return result
+
+
+def _segment_std(values: np.ndarray, offsets: np.ndarray, mean: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    deviations = values - np.repeat(mean, counts)
+    squares = _segment_sum(deviations * deviations, offsets)
+    std = np.zeros(len(counts))
+    many = counts > 1
+    std[many] = np.sqrt(squares[many] / (counts[many] - 1))
+    return std
+
+
+def _segment_unique(sorted_values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    if not len(sorted_values):
+        return np.zeros(len(offsets) - 1, dtype=np.int64)
+    first = np.ones(len(sorted_values), dtype=bool)
+    first[1:] = sorted_values[1:] != sorted_values[:-1]
+    first[offsets[:-1][np.diff(offsets) > 0]] = True
+    return np.bincount(_segment_ids(offsets), weights=first, minlength=len(offsets) - 1).astype(np.int64)
+
+
+def _count_below(sorted_values: np.ndarray, offsets: np.ndarray, queries: np.ndarray, inclusive: bool = False) -> np.ndarray:
+    segments = np.concatenate([_segment_ids(offsets), np.arange(len(queries))])
+    keys = np.concatenate([sorted_values, queries])
+    flags = np.concatenate([np.full(len(sorted_values), 0 if inclusive else 1), np.full(len(queries), 1 if inclusive else 0)])
+    order = np.lexsort((flags, keys, segments))
+    
+    is_value = order < len(sorted_values)
+    values_seen = np.cumsum(is_value)
+    query_slots = np.nonzero(~is_value)[0]
+    query_ids = order[query_slots] - len(sorted_values)
+    
+    counts = np.empty(len(queries), dtype=np.int64)
+    counts[query_ids] = values_seen[query_slots] - offsets[:-1][query_ids]
+    return counts
+
+
+def _none(value, valid: bool):
+    return float(value) if valid else None
+
+
+class OfferBatch:
+    def __init__(
+        self,
+        offsets: np.ndarray,
+        prices: np.ndarray,
+        ratings: np.ndarray,
+        reviews: np.ndarray,
+        in_stock: np.ndarray,
+        sellers: np.ndarray
+    ):
+        self.offsets = offsets
+        self.prices = prices
+        self.ratings = ratings
+        self.reviews = reviews
+        self.in_stock = in_stock
+        self.sellers = sellers
+    
+    @property
+    def size(self) -> int:
+        return len(self.offsets) - 1
+    
+    @property
+    def counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+    
+    @classmethod
+    def from_offers(cls, offers_by_product: Sequence[Optional[List[Dict]]]) -> "OfferBatch":
+        offers_by_product = [offers or [] for offers in offers_by_product]
+        flat = [offer for offers in offers_by_product for offer in offers]
+        seller_codes = {"": 0, None: 1}
+        
+        return cls(
+            offsets=_offsets([len(offers) for offers in offers_by_product]),
+            prices=np.array([o.get("price", 0) for o in flat], dtype=np.float64),
+            ratings=np.array([o.get("seller_rating") or 0 for o in flat], dtype=np.float64),
+            reviews=np.array([o.get("seller_reviews_count", 0) or 0 for o in flat], dtype=np.float64),
+            in_stock=np.array([bool(o.get("in_stock", True)) for o in flat], dtype=bool),
+            sellers=np.array(
+                [seller_codes.setdefault(o.get("seller_name", ""), len(seller_codes)) for o in flat],
+                dtype=np.int64
+            )
+        )
+    
+    def priced(self):
+        offsets, prices = _compact(self.offsets, (self.prices != 0) & ~np.isnan(self.prices), self.prices)
+        return offsets, _sort_segments(prices, offsets)
+
+
+class SeriesBatch:
+    def __init__(self, offsets: np.ndarray, values: np.ndarray, record_counts: np.ndarray):
+        self.offsets = offsets
+        self.values = values
+        self.record_counts = record_counts
+    
+    @property
+    def size(self) -> int:
+        return len(self.offsets) - 1
+    
+    @property
+    def counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+    
+    @classmethod
+    def from_history(cls, histories: Sequence[Optional[List[Dict]]], days: Optional[int] = None) -> "SeriesBatch":
+        histories = [history or [] for history in histories]
+        record_counts = np.array([len(history) for history in histories], dtype=np.int64)
+        if days is not None:
+            histories = [sorted(history[-days:], key=lambda x: x.get("date", "")) for history in histories]
+        
+        return cls(
+            offsets=_offsets([len(history) for history in histories]),
+            values=np.array([r.get("price", 0) or 0 for history in histories for r in history], dtype=np.float64),
+            record_counts=record_counts
+        )
+
+
+class BatchAnalytics:
+    @staticmethod
+    def calculate_statistics(batch: OfferBatch) -> List[Dict]:
+        offsets, prices = batch.priced()
+        counts = np.diff(offsets)
+        has_prices = counts > 0
+        safe_counts = np.maximum(counts, 1)
+        
+        mean = _segment_sum(prices, offsets) / safe_counts
+        first = _take(prices, offsets, np.zeros(batch.size, dtype=np.int64), has_prices)
+        last = _take(prices, offsets, counts - 1, has_prices)
+        low = _take(prices, offsets, (counts - 1) // 2, has_prices)
+        high = _take(prices, offsets, counts // 2, has_prices)
+        std = _segment_std(prices, offsets, mean, counts)
+        
+        return [
+            {
+                "min_price": _none(first[i], has_prices[i]),
+                "max_price": _none(last[i], has_prices[i]),
+                "avg_price": _none(mean[i], has_prices[i]),
+                "median_price": _none((low[i] + high[i]) / 2, has_prices[i]),
+                "price_std": _none(std[i], has_prices[i])
+            }
+            for i in range(batch.size)
+        ]
+    
+    @staticmethod
+    def calculate_price_distribution(batch: OfferBatch) -> List[Dict]:
+        offsets, prices = batch.priced()
+        counts = np.diff(offsets)
+        has_prices = counts > 0
+        
+        mean = _segment_sum(prices, offsets) / np.maximum(counts, 1)
+        std = _segment_std(prices, offsets, mean, counts)
+        median = _take(prices, offsets, counts // 2, has_prices)
+        p25 = _take(prices, offsets, (counts * 0.25).astype(np.int64), has_prices)
+        p75 = _take(prices, offsets, (counts * 0.75).astype(np.int64), has_prices)
+        iqr = np.where(counts > 1, p75 - p25, 0)
+        
+        return [
+            {
+                "min": float(prices[offsets[i]]),
+                "max": float(prices[offsets[i + 1] - 1]),
+                "median": float(median[i]),
+                "p25": float(p25[i]),
+                "p75": float(p75[i]),
+                "iqr": float(iqr[i]),
+                "mean": float(mean[i]),
+                "std": float(std[i])
+            } if has_prices[i] else {}
+            for i in range(batch.size)
+        ]
+    
+    @staticmethod
+    def calculate_price_rank(batch: OfferBatch, user_prices: Sequence[float]) -> List[Dict]:
+        offsets, prices = batch.priced()
+        counts = np.diff(offsets)
+        queries = np.asarray(user_prices, dtype=np.float64)
+        
+        cheaper = _count_below(prices, offsets, queries)
+        expensive = counts - _count_below(prices, offsets, queries, inclusive=True)
+        
+        results = []
+        for i in range(batch.size):
+            if not counts[i]:
+                results.append({"rank": 1, "total": 1, "percentile": 0, "cheaper_count": 0, "expensive_count": 0})
+                continue
+            results.append({
+                "rank": int(cheaper[i]) + 1,
+                "total": int(counts[i]),
+                "percentile": float(cheaper[i] / counts[i] * 100),
+                "cheaper_count": int(cheaper[i]),
+                "expensive_count": int(expensive[i]),
+                "equal_count": int(counts[i] - cheaper[i] - expensive[i])
+            })
+        return results
+    
+    @staticmethod
+    def calculate_volatility(series: SeriesBatch) -> List[Dict]:
+        offsets, prices = _compact(series.offsets, series.values != 0, series.values)
+        prices = _sort_segments(prices, offsets)
+        counts = np.diff(offsets)
+        valid = (series.record_counts >= 2) & (counts >= 2)
+        
+        mean = _segment_sum(prices, offsets) / np.maximum(counts, 1)
+        std = _segment_std(prices, offsets, mean, counts)
+        
+        results = []
+        for i in range(series.size):
+            if not valid[i]:
+                results.append({"volatility": None, "coefficient_of_variation": None, "price_range": None})
+                continue
+            low = float(prices[offsets[i]])
+            high = float(prices[offsets[i + 1] - 1])
+            results.append({
+                "volatility": float(std[i]),
+                "coefficient_of_variation": float(std[i] / mean[i] * 100) if mean[i] > 0 else 0,
+                "price_range": high - low,
+                "min": low,
+                "max": high,
+                "mean": float(mean[i])
+            })
+        return results
+    
+    @staticmethod
+    def detect_trend(series: SeriesBatch) -> List[Dict]:
+        offsets, prices = series.offsets, series.values
+        counts = np.diff(offsets)
+        n = counts.astype(np.float64)
+        local = np.arange(len(prices)) - np.repeat(offsets[:-1], counts)
+        
+        sum_x = n * (n - 1) / 2
+        sum_x2 = (n - 1) * n * (2 * n - 1) / 6
+        sum_y = _segment_sum(prices, offsets)
+        sum_xy = _segment_sum(local * prices, offsets)
+        denominator = n * sum_x2 - sum_x * sum_x
+        slope = np.divide(n * sum_xy - sum_x * sum_y, denominator, out=np.zeros(series.size), where=denominator != 0)
+        
+        alpha = 2 / (n + 1)
+        decay = np.repeat(1 - alpha, counts) ** (np.repeat(counts - 1, counts) - local)
+        weights = np.where(local == 0, decay, np.repeat(alpha, counts) * decay)
+        ema = _segment_sum(weights * prices, offsets)
+        
+        results = []
+        for i in range(series.size):
+            if series.record_counts[i] < 2 or counts[i] < 2:
+                results.append({"trend": "insufficient_data", "slope": None, "direction": None})
+                continue
+            direction = "up" if slope[i] > 0.1 else "down" if slope[i] < -0.1 else "stable"
+            first = prices[offsets[i]]
+            last = prices[offsets[i + 1] - 1]
+            results.append({
+                "trend": direction,
+                "slope": float(slope[i]),
+                "direction": direction,
+                "sma": float(sum_y[i] / n[i]),
+                "ema": float(ema[i]),
+                "change_percent": float((last - first) / first * 100) if first > 0 else 0
+            })
+        return results
+    
+    @staticmethod
+    def calculate_demand_proxy(batch: OfferBatch, price_updates: Optional[Sequence[int]] = None) -> List[Dict]:
+        sellers_count = _segment_unique(_sort_segments(batch.sellers, batch.offsets), batch.offsets)
+        purchase_count_proxy = _segment_sum(batch.reviews, batch.offsets)
+        rating_offsets, ratings = _compact(batch.offsets, batch.ratings != 0, batch.ratings)
+        rating_counts = np.diff(rating_offsets)
+        avg_rating = np.divide(_segment_sum(ratings, rating_offsets), rating_counts, out=np.zeros(batch.size), where=rating_counts > 0)
+        updates = np.asarray(price_updates if price_updates is not None else np.zeros(batch.size), dtype=np.float64)
+        
+        demand_score = (
+            (sellers_count / 10) * 0.3 +
+            np.minimum(updates / 100, 1) * 0.2 +
+            np.minimum(purchase_count_proxy / 1000, 1) * 0.3 +
+            (avg_rating / 5) * 0.2
+        )
+        
+        return [
+            {
+                "demand_score": float(demand_score[i]),
+                "sellers_count": int(sellers_count[i]),
+                "price_updates_count": int(updates[i]),
+                "purchase_count_proxy": int(purchase_count_proxy[i]),
+                "avg_rating": float(avg_rating[i]),
+                "competition_level": "high" if sellers_count[i] > 10 else "medium" if sellers_count[i] > 5 else "low"
+            }
+            for i in range(batch.size)
+        ]
+    
+    @staticmethod
+    def calculate_optimal_price(batch: OfferBatch, target_position: int = 5, margin_percent: float = 0.1) -> List[Dict]:
+        prices = _sort_segments(batch.prices, batch.offsets)
+        counts = batch.counts
+        has_offers = counts > 0
+        optimal = _take(prices, batch.offsets, np.minimum(target_position - 1, counts - 1), has_offers)
+        cost = optimal / (1 + margin_percent)
+        
+        return [
+            {
+                "optimal_price": float(optimal[i]),
+                "estimated_position": target_position,
+                "margin_percent": margin_percent * 100,
+                "margin_amount": float(optimal[i] - cost[i]),
+                "cost_price": float(cost[i])
+            } if has_offers[i] else {"optimal_price": None, "estimated_position": None, "margin": None}
+            for i in range(batch.size)
+        ]
+    
+    @staticmethod
+    def calculate_entry_barrier(batch: OfferBatch) -> List[Dict]:
+        counts = batch.counts
+        prices = _sort_segments(batch.prices, batch.offsets)
+        price_density = _segment_unique(prices, batch.offsets) / np.maximum(counts, 1)
+        mean = _segment_sum(prices, batch.offsets) / np.maximum(counts, 1)
+        price_std = _segment_std(prices, batch.offsets, mean, counts)
+        
+        rating_offsets, ratings = _compact(batch.offsets, batch.ratings != 0, batch.ratings)
+        ratings = _sort_segments(ratings, rating_offsets)
+        rating_counts = np.diff(rating_offsets)
+        has_ratings = rating_counts > 0
+        avg_rating = np.divide(_segment_sum(ratings, rating_offsets), rating_counts, out=np.zeros(batch.size), where=has_ratings)
+        top_rating = np.nan_to_num(_take(ratings, rating_offsets, rating_counts - 1, has_ratings))
+        
+        barrier_score = (
+            (1 - price_density) * 0.3 +
+            (avg_rating / 5) * 0.3 +
+            (top_rating / 5) * 0.2 +
+            np.minimum(price_std / 100, 1) * 0.2
+        )
+        
+        results = []
+        for i in range(batch.size):
+            if not counts[i]:
+                results.append({"barrier_score": 0, "level": "low", "factors": []})
+                continue
+            
+            factors = []
+            if price_density[i] < 0.3:
+                factors.append("Высокая плотность цен")
+            if avg_rating[i] > 4.5:
+                factors.append("Высокий средний рейтинг конкурентов")
+            if top_rating[i] > 4.8:
+                factors.append("Есть продавцы с очень высоким рейтингом")
+            if price_std[i] < 20:
+                factors.append("Низкая волатильность цен")
+            
+            score = float(barrier_score[i])
+            results.append({
+                "barrier_score": score,
+                "level": "high" if score > 0.7 else "medium" if score > 0.4 else "low",
+                "factors": factors,
+                "price_density": float(price_density[i]),
+                "avg_rating": float(avg_rating[i]),
+                "top_rating": float(top_rating[i]),
+                "price_std": float(price_std[i])
+            })
+        return results
+    
+    @staticmethod
+    def calculate_daily_metrics(batch: OfferBatch) -> List[Dict]:
+        statistics = BatchAnalytics.calculate_statistics(batch)
+        offsets, prices = batch.priced()
+        counts = np.diff(offsets)
+        positions = {
+            position: _take(prices, offsets, np.full(batch.size, position - 1), counts >= position)
+            for position in (1, 3, 5, 10)
+        }
+        
+        rating_offsets, ratings = _compact(batch.offsets, batch.ratings != 0, batch.ratings)
+        rating_counts = np.diff(rating_offsets)
+        rating_sums = _segment_sum(ratings, rating_offsets)
+        in_stock_count = _segment_sum(batch.in_stock.astype(np.float64), batch.offsets)
+        
+        named_offsets, named = _compact(batch.offsets, batch.sellers > 1, batch.sellers)
+        unique_sellers = _segment_unique(_sort_segments(named, named_offsets), named_offsets)
+        
+        for i, stats in enumerate(statistics):
+            stats.update({
+                "offers_count": int(batch.counts[i]),
+                "unique_sellers": int(unique_sellers[i]),
+                "price_position_1": _none(positions[1][i], counts[i] >= 1),
+                "price_position_3": _none(positions[3][i], counts[i] >= 3),
+                "price_position_5": _none(positions[5][i], counts[i] >= 5),
+                "price_position_10": _none(positions[10][i], counts[i] >= 10),
+                "avg_seller_rating": _none(rating_sums[i] / max(rating_counts[i], 1), rating_counts[i] > 0),
+                "in_stock_count": int(in_stock_count[i])
+            })
+        return statistics
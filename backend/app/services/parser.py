@@ -1,10 +1,18 @@
 import re
+import json
+import math
+import time
+import hashlib
+import asyncio
 import httpx
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.services.rate_limiter import rate_limiter
+from app.services.single_flight import SingleFlight
 from tenacity import (
     retry,
     stop_after_attempt,
-    wait_exponential,
+    wait_random_exponential,
     retry_if_exception_type,
     retry_if_result,
     RetryError
@@ -14,6 +22,125 @@ import logging
 logger = logging.getLogger(__name__)
 
 KASPI_API_URL = "https://kaspi.kz/yml/offer-view/offers/{product_id}"
+KASPI_HOME_URL = "https://kaspi.kz"
+CITY_COOKIE = "kaspi.storefront.cookie.city"
+
+
+def compute_offers_fingerprint(offers: List[Dict], total_sellers: Optional[int] = None) -> str:
+    snapshot = [
+        [
+            str(o.get("seller_id") or o.get("seller_name") or ""),
+            o.get("price"),
+            bool(o.get("in_stock", True)),
+            o.get("position"),
+        ]
+        for o in offers
+    ]
+    payload = json.dumps({"offers": snapshot, "total": total_sellers}, separators=(",", ":"))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class KaspiSession:
+    def __init__(self, client: httpx.AsyncClient, city_id: str, loop: asyncio.AbstractEventLoop):
+        self.client = client
+        self.city_id = city_id
+        self.loop = loop
+        self.lock = asyncio.Lock()
+        self.warmed_at: Optional[float] = None
+
+    def is_expired(self) -> bool:
+        if self.warmed_at is None:
+            return True
+        if CITY_COOKIE not in self.client.cookies:
+            return True
+        return time.monotonic() - self.warmed_at > settings.KASPI_SESSION_TTL
+
+
+class KaspiClientPool:
+    def __init__(self):
+        self._sessions: Dict[Tuple[str, Optional[str]], KaspiSession] = {}
+
+    def _build_client(self, proxy: Optional[str]) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        )
+        return httpx.AsyncClient(
+            timeout=settings.PARSING_TIMEOUT,
+            proxies=proxy,
+            http2=True,
+            follow_redirects=True,
+            limits=limits,
+        )
+
+    async def _warm_up(self, session: KaspiSession, user_agent: str, timeout: int):
+        session.client.cookies.clear()
+        try:
+            await session.client.get(
+                KASPI_HOME_URL,
+                headers={
+                    "User-Agent": user_agent,
+                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                },
+                timeout=timeout,
+            )
+        except Exception as e:
+            logger.warning(f"Could not initialize session: {e}")
+        if CITY_COOKIE not in session.client.cookies:
+            session.client.cookies.set(CITY_COOKIE, session.city_id, domain="kaspi.kz")
+        session.warmed_at = time.monotonic()
+
+    async def get_client(
+        self,
+        city_id: str,
+        proxy: Optional[str],
+        user_agent: str,
+        timeout: int,
+    ) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        key = (city_id, proxy)
+        session = self._sessions.get(key)
+        if session is None or session.loop is not loop or session.client.is_closed:
+            stale = session
+            session = KaspiSession(self._build_client(proxy), city_id, loop)
+            self._sessions[key] = session
+            if stale is not None:
+                await self._close_session(stale)
+
+        if session.is_expired():
+            async with session.lock:
+                if session.is_expired():
+                    await self._warm_up(session, user_agent, timeout)
+        return session.client
+
+    def expire_session(self, city_id: str, proxy: Optional[str]):
+        session = self._sessions.get((city_id, proxy))
+        if session:
+            session.warmed_at = None
+
+    async def _close_session(self, session: KaspiSession):
+        if session.client.is_closed:
+            return
+        try:
+            if session.loop is not asyncio.get_running_loop() and session.loop.is_running():
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(session.client.aclose(), session.loop)
+                )
+            else:
+                await session.client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing HTTP client: {e}")
+
+    async def aclose(self):
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            await self._close_session(session)
+
+
+client_pool = KaspiClientPool()
+product_flights = SingleFlight("kaspi:product")
 
 
 class KaspiAPIParser:
@@ -23,11 +150,17 @@ class KaspiAPIParser:
         timeout: int = 10,
         top_n: int = 10,
         proxy: Optional[str] = None,
+        parse_all_pages: Optional[bool] = None,
+        max_pages: Optional[int] = None,
+        page_concurrency: Optional[int] = None,
     ):
         self.city_id = city_id
         self.timeout = timeout
         self.top_n = top_n
         self.proxy = proxy
+        self.parse_all_pages = settings.PARSE_ALL_PRICES if parse_all_pages is None else parse_all_pages
+        self.max_pages = max_pages or settings.MAX_PARSING_PAGES
+        self.page_concurrency = page_concurrency or settings.PAGE_CONCURRENCY
 
     def extract_product_id(self, url: str) -> str:
         url = url.strip().rstrip('/')
@@ -52,52 +185,39 @@ class KaspiAPIParser:
         raise ValueError(f"Cannot extract product id from URL: {url}")
 
     async def _make_request(self, product_id: str, headers: Dict, payload: Dict) -> Dict:
-        async with httpx.AsyncClient(
-            timeout=self.timeout,
-            proxies=self.proxy,
-            http2=True,
-            follow_redirects=True,
-            cookies={},
-        ) as client:
-            try:
-                init_response = await client.get(
-                    "https://kaspi.kz",
-                    headers={
-                        "User-Agent": headers["User-Agent"],
-                        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-                    },
-                    timeout=self.timeout,
-                )
-                if "kaspi.storefront.cookie.city" not in client.cookies:
-                    client.cookies.set("kaspi.storefront.cookie.city", self.city_id, domain="kaspi.kz")
-            except Exception as e:
-                logger.warning(f"Could not initialize session: {e}")
-            
+        client = await client_pool.get_client(
+            self.city_id,
+            self.proxy,
+            headers["User-Agent"],
+            self.timeout,
+        )
+
+        await rate_limiter.acquire()
+        started = time.monotonic()
+        try:
             response = await client.post(
                 KASPI_API_URL.format(product_id=product_id),
                 headers=headers,
                 json=payload,
+                timeout=self.timeout,
             )
+        except httpx.TimeoutException:
+            await rate_limiter.on_throttled()
+            raise
 
-            response.raise_for_status()
-            return response.json()
+        if response.status_code == 429 or response.status_code >= 500:
+            await rate_limiter.on_throttled()
+        elif response.status_code < 400:
+            await rate_limiter.on_success(time.monotonic() - started)
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=10),
-        retry=retry_if_exception_type((
-            httpx.TimeoutException,
-            httpx.NetworkError,
-            httpx.ConnectError,
-            httpx.ReadError,
-            httpx.HTTPStatusError
-        )),
-        reraise=True
-    )
-    async def parse_product(self, product_url: str) -> Dict:
-        product_id = self.extract_product_id(product_url)
+        if response.status_code in (401, 403):
+            client_pool.expire_session(self.city_id, self.proxy)
 
-        headers = {
+        response.raise_for_status()
+        return response.json()
+
+    def _build_headers(self, product_url: str) -> Dict:
+        return {
             "Accept": "application/json, text/*",
             "Accept-Language": "en-US,en;q=0.9",
             "Content-Type": "application/json; charset=UTF-8",
@@ -116,11 +236,12 @@ class KaspiAPIParser:
             "sec-ch-ua-platform": '"macOS"',
         }
 
+    def _build_payload(self, product_id: str, page: int) -> Dict:
         payload = {
             "cityId": self.city_id,
             "id": str(product_id),
             "merchantUID": [],
-            "page": 0,
+            "page": page,
             "product": {
                 "brand": None,
                 "categoryCodes": [],
@@ -135,12 +256,34 @@ class KaspiAPIParser:
             "zoneId": ["Magnum_ZONE1"],
             "installationId": "-1",
         }
-        
-        if self.top_n and self.top_n > 0:
+
+        if self.parse_all_pages:
+            payload["limit"] = settings.OFFERS_PAGE_SIZE
+            if self.top_n and 0 < self.top_n < settings.OFFERS_PAGE_SIZE:
+                payload["limit"] = self.top_n
+        elif self.top_n and self.top_n > 0:
             payload["limit"] = self.top_n
 
+        return payload
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_random_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception_type((
+            httpx.TimeoutException,
+            httpx.NetworkError,
+            httpx.ConnectError,
+            httpx.ReadError,
+            httpx.HTTPStatusError
+        )),
+        reraise=True
+    )
+    async def _fetch_page(self, product_id: str, product_url: str, page: int) -> Dict:
+        headers = self._build_headers(product_url)
+        payload = self._build_payload(product_id, page)
+
         try:
-            data = await self._make_request(product_id, headers, payload)
+            return await self._make_request(product_id, headers, payload)
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 400:
                 logger.error(f"HTTP 400 for product {product_id}: {e.response.text}")
@@ -154,14 +297,106 @@ class KaspiAPIParser:
             else:
                 raise
         except (httpx.TimeoutException, httpx.NetworkError, httpx.ConnectError, httpx.ReadError) as e:
-            logger.warning(f"Network error for product {product_id}: {e}, will retry")
+            logger.warning(f"Network error for product {product_id}, page {page}: {e}, will retry")
             raise
         except RetryError as e:
             logger.error(f"Failed to parse product {product_id} after retries: {e.last_attempt.exception()}")
             raise e.last_attempt.exception()
 
+    def _pages_to_fetch(self, first_page: Dict) -> int:
+        offers = first_page.get("offers", [])
+        total = first_page.get("total") or first_page.get("offersCount") or 0
+        page_size = len(offers)
+        if not page_size or total <= page_size:
+            return 1
+
+        pages = math.ceil(total / page_size)
+        if self.top_n and self.top_n > 0:
+            pages = min(pages, math.ceil(self.top_n / page_size))
+        return max(1, min(pages, self.max_pages))
+
+    async def _crawl_pages(self, product_id: str, product_url: str) -> Dict:
+        first_page = await self._fetch_page(product_id, product_url, 0)
+        page_count = self._pages_to_fetch(first_page)
+        if page_count <= 1:
+            return first_page
+
+        page_size = len(first_page.get("offers", []))
+        semaphore = asyncio.Semaphore(self.page_concurrency)
+        last_page = page_count - 1
+
+        async def fetch(page: int) -> List[Dict]:
+            nonlocal last_page
+            async with semaphore:
+                if page > last_page:
+                    return []
+                data = await self._fetch_page(product_id, product_url, page)
+            offers = data.get("offers", [])
+            if len(offers) < page_size:
+                last_page = min(last_page, page)
+            return offers
+
+        pages = await asyncio.gather(*(fetch(page) for page in range(1, page_count)))
+
+        merged: List[Dict] = []
+        seen_merchants = set()
+        for offers in [first_page.get("offers", [])] + list(pages):
+            for offer in offers:
+                merchant_id = offer.get("merchantId")
+                if merchant_id is not None:
+                    if merchant_id in seen_merchants:
+                        continue
+                    seen_merchants.add(merchant_id)
+                merged.append(offer)
+
+        if self.top_n and self.top_n > 0:
+            merged = merged[:self.top_n]
+
+        logger.info(f"Crawled {page_count} pages for product {product_id}: {len(merged)} offers")
+        return {**first_page, "offers": merged}
+
+    async def parse_product(self, product_url: str) -> Dict:
+        product_id = self.extract_product_id(product_url)
+        flight_key = f"{self.city_id}:{product_id}:{self.top_n or 0}:{int(self.parse_all_pages)}:{self.max_pages}"
+        return await product_flights.do(
+            flight_key,
+            lambda: self._parse_product(product_id, product_url),
+        )
+
+    async def _parse_product(self, product_id: str, product_url: str) -> Dict:
+        if self.parse_all_pages:
+            data = await self._crawl_pages(product_id, product_url)
+        else:
+            data = await self._fetch_page(product_id, product_url, 0)
+
         return self._normalize_response(product_id, data)
 
+    async def parse_many(
+        self,
+        urls: List[str],
+        concurrency: Optional[int] = None,
+        on_start: Optional[Callable[[int, str], Awaitable[None]]] = None,
+    ) -> AsyncIterator[Dict]:
+        semaphore = asyncio.Semaphore(concurrency or settings.MAX_CONCURRENT_JOBS)
+
+        async def worker(index: int, url: str) -> Dict:
+            async with semaphore:
+                try:
+                    if on_start is not None:
+                        await on_start(index, url)
+                    data = await self.parse_product(url)
+                    return {"index": index, "url": url, "data": data, "error": None}
+                except Exception as e:
+                    return {"index": index, "url": url, "data": None, "error": str(e) or type(e).__name__}
+
+        tasks = [asyncio.create_task(worker(index, url)) for index, url in enumerate(urls)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
     def _normalize_response(self, product_id: str, data: Dict) -> Dict:
         offers_raw = data.get("offers", [])
         total_sellers = data.get("total") or data.get("offersCount")
@@ -208,4 +443,5 @@ class KaspiAPIParser:
             "offers": offers,
             "price_buckets": price_buckets,
             "raw_total_sellers": total_sellers,
+            "fingerprint": compute_offers_fingerprint(offers, total_sellers),
         }
@@ -0,0 +1,120 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import List
+from datetime import date
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "price_history"
+
+
+def month_start(value: date, offset: int = 0) -> date:
+    month_index = value.year * 12 + value.month - 1 + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(start: date) -> str:
+    return f"{PARENT_TABLE}_{start.year:04d}_{start.month:02d}"
+
+
+class PartitionService:
+    @staticmethod
+    def is_partitioned(db: Session) -> bool:
+        if db.get_bind().dialect.name != "postgresql":
+            return False
+        return db.execute(text(
+            "SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace"
+        ), {"table": PARENT_TABLE}).first() is not None
+    
+    @staticmethod
+    def list_partitions(db: Session) -> List[str]:
+        rows = db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :table ORDER BY c.relname"
+        ), {"table": PARENT_TABLE}).all()
+        return [row[0] for row in rows]
+    
+    @staticmethod
+    def ensure_partitions(db: Session, today: date = None, months_ahead: int = None) -> List[str]:
+        if not PartitionService.is_partitioned(db):
+            return []
+        
+        today = today or date.today()
+        months_ahead = settings.HISTORY_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+        existing = set(PartitionService.list_partitions(db))
+        created = []
+        
+        db.execute(text(f"CREATE TABLE IF NOT EXISTS {PARENT_TABLE}_default PARTITION OF {PARENT_TABLE} DEFAULT"))
+        db.commit()
+        for offset in range(0, months_ahead + 1):
+            start = month_start(today, offset)
+            name = partition_name(start)
+            if name in existing:
+                continue
+            try:
+                moved = PartitionService._create_partition(db, name, start, month_start(start, 1))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to create partition {name}: {e}")
+                continue
+            if moved:
+                logger.info(f"Moved {moved} rows from {PARENT_TABLE}_default to {name}")
+            created.append(name)
+        
+        if created:
+            logger.info(f"Created {PARENT_TABLE} partitions: {', '.join(created)}")
+        return created
+    
+    @staticmethod
+    def _create_partition(db: Session, name: str, start: date, end: date) -> int:
+        bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        params = {"start": start, "end": end}
+        db.execute(text(f"LOCK TABLE {PARENT_TABLE}_default IN SHARE ROW EXCLUSIVE MODE"))
+        has_rows = db.execute(text(
+            f"SELECT 1 FROM {PARENT_TABLE}_default WHERE recorded_at >= :start AND recorded_at < :end LIMIT 1"
+        ), params).first() is not None
+        if not has_rows:
+            db.execute(text(f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} {bounds}"))
+            return 0
+        
+        db.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        moved = db.execute(text(
+            f"WITH moved AS ("
+            f"DELETE FROM {PARENT_TABLE}_default WHERE recorded_at >= :start AND recorded_at < :end RETURNING *"
+            f") INSERT INTO {name} SELECT * FROM moved"
+        ), params).rowcount
+        db.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} {bounds}"))
+        return moved
+    
+    @staticmethod
+    def detach_old_partitions(db: Session, today: date = None, retention_months: int = None) -> List[str]:
+        retention_months = settings.HISTORY_PARTITION_RETENTION_MONTHS if retention_months is None else retention_months
+        if retention_months <= 0 or not PartitionService.is_partitioned(db):
+            return []
+        
+        cutoff = partition_name(month_start(today or date.today(), -retention_months))
+        detached = []
+        for name in PartitionService.list_partitions(db):
+            if name == f"{PARENT_TABLE}_default" or name >= cutoff:
+                continue
+            db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            detached.append(name)
+        db.commit()
+        
+        if detached:
+            logger.info(f"Detached {PARENT_TABLE} partitions: {', '.join(detached)}")
+        return detached
+    
+    @staticmethod
+    def run_maintenance(db: Session) -> dict:
+        return {
+            "created": PartitionService.ensure_partitions(db),
+            "detached": PartitionService.detach_old_partitions(db),
+        }
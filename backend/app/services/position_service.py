@@ -1,14 +1,26 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 from app.services.parser import KaspiAPIParser
-from app.core.redis_client import redis_client
+from app.core.config import settings
+from app.core.redis_client import async_redis_client
 from app.schemas.analytics import PositionEstimate
+from redis.exceptions import RedisError
+from bisect import bisect_left
+import asyncio
 import json
-import hashlib
-from datetime import datetime, timedelta
+import logging
+import math
+import random
+import time
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
 
 
 class PositionService:
-    CACHE_TTL = 600
+    CACHE_TTL = settings.POSITION_CACHE_TTL
+    STALE_TTL = settings.POSITION_STALE_TTL
+    _refresh_tasks: Set[asyncio.Task] = set()
     
     @staticmethod
     async def get_exact_position(
@@ -16,92 +28,157 @@ class PositionService:
         user_price: float,
         force_refresh: bool = False
     ) -> PositionEstimate:
-        cache_key = f"position:exact:{kaspi_id}"
-        
+        estimates = await PositionService.get_exact_positions(kaspi_id, [user_price], force_refresh)
+        return estimates[0]
+    
+    @staticmethod
+    async def get_exact_positions(
+        kaspi_id: str,
+        user_prices: List[float],
+        force_refresh: bool = False
+    ) -> List[PositionEstimate]:
         if not force_refresh:
-            cached_data = redis_client.client.get(cache_key)
-            if cached_data:
-                cached = json.loads(cached_data)
-                prices = cached.get("prices", [])
-                total_sellers = cached.get("total_sellers", 0)
-                
-                if prices:
-                    position = PositionService._calculate_position(prices, user_price, total_sellers)
-                    return PositionEstimate(
-                        user_price=user_price,
-                        estimated_position=position["position"],
-                        total_sellers=position["total_sellers"],
-                        percentile=position["percentile"]
-                    )
-        
-        parser = KaspiAPIParser(top_n=None)
-        url = f"https://kaspi.kz/shop/p/{kaspi_id}/"
+            try:
+                estimates = await PositionService._from_cache(kaspi_id, user_prices)
+            except RedisError as e:
+                logger.warning(f"Position cache unavailable for {kaspi_id}: {e}")
+                estimates = None
+            if estimates is not None:
+                return estimates
         
         try:
-            data = await parser.parse_product(url)
-            offers = data.get("offers", [])
-            
-            if not offers:
-                return PositionEstimate(
+            prices = await PositionService._refresh(kaspi_id)
+        except Exception as e:
+            logger.warning(f"Position refresh failed for {kaspi_id}: {e}")
+            prices = []
+        
+        if not prices:
+            return [
+                PositionEstimate(
                     user_price=user_price,
                     estimated_position=1,
                     total_sellers=1,
                     percentile=0
                 )
-            
-            prices = sorted([offer["price"] for offer in offers if offer.get("price")])
-            total_sellers = len(prices)
-            
-            position_data = PositionService._calculate_position(prices, user_price, total_sellers)
-            
-            cache_data = {
-                "prices": prices,
-                "total_sellers": total_sellers,
-                "cached_at": datetime.utcnow().isoformat()
-            }
-            redis_client.client.setex(
-                cache_key,
-                PositionService.CACHE_TTL,
-                json.dumps(cache_data)
-            )
-            
-            return PositionEstimate(
-                user_price=user_price,
-                estimated_position=position_data["position"],
-                total_sellers=position_data["total_sellers"],
-                percentile=position_data["percentile"]
-            )
-        except Exception as e:
-            return PositionEstimate(
-                user_price=user_price,
-                estimated_position=1,
-                total_sellers=1,
-                percentile=0
-            )
+                for user_price in user_prices
+            ]
+        
+        total_sellers = len(prices)
+        return [
+            PositionService._to_estimate(user_price, PositionService._calculate_position(prices, user_price, total_sellers), 0.0)
+            for user_price in user_prices
+        ]
     
     @staticmethod
-    def _calculate_position(prices: List[float], user_price: float, total_sellers: int) -> Dict:
-        if not prices:
-            return {
-                "position": 1,
-                "total_sellers": 1,
-                "percentile": 0
-            }
+    async def _from_cache(kaspi_id: str, user_prices: List[float]) -> Optional[List[PositionEstimate]]:
+        cache_key = f"position:exact:{kaspi_id}"
+        cached_data = await async_redis_client.get(cache_key)
+        if not cached_data:
+            return None
         
-        sorted_prices = sorted(prices)
+        cached = json.loads(cached_data)
+        total_sellers = cached.get("total_sellers", 0)
+        age = PositionService._age(cached)
+        if age >= PositionService.CACHE_TTL + PositionService.STALE_TTL:
+            return None
         
-        if user_price < sorted_prices[0]:
-            position = 1
-        elif user_price > sorted_prices[-1]:
-            position = total_sellers + 1
+        indexed = await async_redis_client.count_cheaper(f"{cache_key}:prices", user_prices)
+        if indexed is not None:
+            positions = [PositionService._position_from_rank(cheaper_count, total_sellers) for cheaper_count in indexed[1]]
+        elif cached.get("prices"):
+            positions = [PositionService._calculate_position(cached["prices"], user_price, total_sellers) for user_price in user_prices]
         else:
-            cheaper_count = sum(1 for price in sorted_prices if price < user_price)
-            equal_count = sum(1 for price in sorted_prices if price == user_price)
-            
-            if equal_count > 0:
-                position = cheaper_count + 1
-            else:
-                position = cheaper_count + 1
+            return None
+        
+        if PositionService._should_refresh(age, cached.get("compute_time", 0)):
+            await PositionService._schedule_refresh(kaspi_id)
+        
+        return [
+            PositionService._to_estimate(user_price, position, age)
+            for user_price, position in zip(user_prices, positions)
+        ]
+    
+    @staticmethod
+    def _age(cached: Dict) -> float:
+        if "fetched_at" in cached:
+            return max(0.0, time.time() - cached["fetched_at"])
+        cached_at = datetime.fromisoformat(cached["cached_at"])
+        return max(0.0, (datetime.utcnow() - cached_at).total_seconds())
+    
+    @staticmethod
+    def _should_refresh(age: float, compute_time: float) -> bool:
+        # XFetch: refresh early with a probability that grows as the entry nears expiry
+        # and with how long the last refresh took.
+        jitter = -compute_time * settings.POSITION_EARLY_EXPIRY_BETA * math.log(1.0 - random.random())
+        return age + jitter >= PositionService.CACHE_TTL
+    
+    @staticmethod
+    async def _schedule_refresh(kaspi_id: str):
+        lock_key = f"position:exact:{kaspi_id}:refresh"
+        token = uuid.uuid4().hex
+        if not await async_redis_client.acquire_lock(lock_key, token, settings.POSITION_REFRESH_LOCK_TTL):
+            return
+        
+        task = asyncio.create_task(PositionService._background_refresh(kaspi_id, lock_key, token))
+        PositionService._refresh_tasks.add(task)
+        task.add_done_callback(PositionService._refresh_tasks.discard)
+    
+    @staticmethod
+    async def _background_refresh(kaspi_id: str, lock_key: str, token: str):
+        refreshed = False
+        try:
+            refreshed = bool(await PositionService._refresh(kaspi_id))
+        except Exception as e:
+            logger.warning(f"Background position refresh failed for {kaspi_id}: {e}")
+        
+        if not refreshed:
+            # Keep the lock until its TTL so the next refresh backs off instead of retrying on every read.
+            return
+        
+        try:
+            await async_redis_client.release_lock(lock_key, token)
+        except RedisError as e:
+            logger.warning(f"Could not release position refresh lock for {kaspi_id}: {e}")
+    
+    @staticmethod
+    async def _refresh(kaspi_id: str) -> List[float]:
+        cache_key = f"position:exact:{kaspi_id}"
+        started = time.monotonic()
+        
+        parser = KaspiAPIParser(top_n=None)
+        data = await parser.parse_product(f"https://kaspi.kz/shop/p/{kaspi_id}/")
+        prices = sorted([offer["price"] for offer in data.get("offers", []) if offer.get("price")])
+        if not prices:
+            return prices
+        
+        cache_data = {
+            "total_sellers": len(prices),
+            "cached_at": datetime.utcnow().isoformat(),
+            "fetched_at": time.time(),
+            "compute_time": time.monotonic() - started
+        }
+        ttl = PositionService.CACHE_TTL + PositionService.STALE_TTL
+        try:
+            await async_redis_client.set_price_index(f"{cache_key}:prices", prices, ttl=ttl)
+            await async_redis_client.setex(cache_key, ttl, json.dumps(cache_data))
+        except RedisError as e:
+            logger.warning(f"Could not cache positions for {kaspi_id}: {e}")
+        return prices
+    
+    @staticmethod
+    def _to_estimate(user_price: float, position: Dict, age: Optional[float] = None) -> PositionEstimate:
+        return PositionEstimate(
+            user_price=user_price,
+            estimated_position=position["position"],
+            total_sellers=position["total_sellers"],
+            percentile=position["percentile"],
+            data_age_seconds=age,
+            is_stale=age is not None and age >= PositionService.CACHE_TTL
+        )
+    
+    @staticmethod
+    def _position_from_rank(cheaper_count: int, total_sellers: int) -> Dict:
+        position = cheaper_count + 1
         
         percentile = ((total_sellers - position + 1) / total_sellers * 100) if total_sellers > 0 else 0
         percentile = max(0, min(100, percentile))
@@ -111,4 +188,14 @@ class PositionService:
             "total_sellers": total_sellers,
             "percentile": percentile
         }
-
+    
+    @staticmethod
+    def _calculate_position(prices: List[float], user_price: float, total_sellers: int) -> Dict:
+        if not prices:
+            return {
+                "position": 1,
+                "total_sellers": 1,
+                "percentile": 0
+            }
+        
+        return PositionService._position_from_rank(bisect_left(sorted(prices), user_price), total_sellers)
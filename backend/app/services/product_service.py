@@ -1,13 +1,59 @@
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional
-from app.models.product import Product, Seller, Offer, PriceHistory
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from app.models.product import Product, Seller, Offer, PriceHistory, ProductSnapshot
 from app.models.job import ParsingJob, JobStatus
 from app.core.redis_client import redis_client
 from app.core.database import SessionLocal
+from app.core.config import settings
+from app.core.bulk_writer import BulkWriter
+from app.core.pagination import keyset_paginate
+from app.core.metrics import active_jobs, failed_parsing, successful_parsing, unchanged_snapshots
 from app.services.parser import KaspiAPIParser
+from app.services.snapshot_service import SnapshotService
+from app.services.stats_service import StatsService
+from app.services.search_service import SearchService
 from datetime import datetime
 import asyncio
 import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SellerCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple]" = OrderedDict()
+    
+    def get(self, kaspi_id: str) -> Optional[Tuple]:
+        entry = self._entries.get(kaspi_id)
+        if entry is not None:
+            self._entries.move_to_end(kaspi_id)
+        return entry
+    
+    def update(self, entries: Dict[str, Tuple]):
+        for kaspi_id, entry in entries.items():
+            self._entries[kaspi_id] = entry
+            self._entries.move_to_end(kaspi_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        self._entries.clear()
+
+
+seller_cache = SellerCache(settings.SELLER_CACHE_SIZE)
+
+
+def new_history_writer() -> BulkWriter:
+    return BulkWriter(
+        PriceHistory.__table__,
+        ["product_id", "seller_id", "price", "position", "recorded_at"]
+    )
 
 
 class ProductService:
@@ -21,163 +67,367 @@ class ProductService:
         
         try:
             if job_id:
-                job = db.query(ParsingJob).filter(ParsingJob.id == job_id).first()
-                if job:
-                    job.status = JobStatus.PARSING
-                    job.started_at = datetime.utcnow()
-                    db.commit()
-                    from app.api.v1.websocket import notify_job_status
-                    await notify_job_status(job_id, "parsing", "Парсинг начат")
+                await ProductService._mark_job_started(db, job_id)
             
             parser = KaspiAPIParser(
                 top_n=None
             )
             data = await parser.parse_product(url)
             
-            kaspi_id = data["kaspi_id"]
-            
-            product = db.query(Product).filter(Product.kaspi_id == kaspi_id).first()
-            
-            if not product:
-                product = Product(
-                    kaspi_id=kaspi_id,
-                    name=data.get("name"),
-                    category=data.get("category")
-                )
-                db.add(product)
-                db.commit()
-                db.refresh(product)
-            
-            product.name = data.get("name") or product.name
-            product.category = data.get("category") or product.category
-            product.updated_at = datetime.utcnow()
+            product = ProductService.save_parsed_product(db, data)
             
-            parse_timestamp = datetime.utcnow()
-            
-            old_offers = db.query(Offer).filter(Offer.product_id == product.id).all()
-            for old_offer in old_offers:
-                price_history = PriceHistory(
-                    product_id=product.id,
-                    seller_id=old_offer.seller_id,
-                    price=old_offer.price,
-                    position=old_offer.position,
-                    recorded_at=old_offer.parsed_at or parse_timestamp
-                )
-                db.add(price_history)
+            if job_id:
+                await ProductService._mark_job_completed(db, job_id, product)
             
-            db.query(Offer).filter(Offer.product_id == product.id).delete()
+            return product
             
-            offers_for_redis = [
-                {
-                    "price": o["price"],
-                    "seller_name": o["seller_name"],
-                    "position": o.get("position")
+        except Exception as e:
+            db.rollback()
+            if job_id:
+                await ProductService._mark_job_failed(db, job_id, e)
+            raise
+        finally:
+            if should_close:
+                db.close()
+    
+    @staticmethod
+    async def parse_and_save_many(
+        urls: List[str],
+        job_ids: Optional[List[Optional[int]]] = None,
+        concurrency: Optional[int] = None,
+        db: Optional[Session] = None,
+        history_writer: Optional[BulkWriter] = None
+    ) -> AsyncIterator[Dict]:
+        if db is None:
+            db = SessionLocal()
+            should_close = True
+        else:
+            should_close = False
+        
+        job_ids = job_ids or [None] * len(urls)
+        if history_writer is None:
+            history_writer = new_history_writer()
+        
+        in_flight = set()
+        
+        async def on_start(index: int, url: str):
+            in_flight.add(index)
+            active_jobs.inc()
+            if job_ids[index]:
+                await ProductService._mark_job_started(db, job_ids[index])
+        
+        try:
+            parser = KaspiAPIParser(
+                top_n=None
+            )
+            async for item in parser.parse_many(urls, concurrency=concurrency, on_start=on_start):
+                if item["index"] in in_flight:
+                    in_flight.discard(item["index"])
+                    active_jobs.dec()
+                job_id = job_ids[item["index"]]
+                result = {
+                    "url": item["url"],
+                    "job_id": job_id,
+                    "product_id": None,
+                    "error": item["error"]
                 }
-                for o in data["offers"]
-            ]
-            redis_client.set_product_offers(str(product.id), offers_for_redis, ttl=3600)
-            
-            top_offers = data["offers"][:10]
-            
-            for offer_data in top_offers:
-                seller_name = offer_data["seller_name"]
-                seller_kaspi_id = offer_data.get("seller_id")
-                
-                if not seller_kaspi_id:
-                    seller_kaspi_id = hashlib.md5(seller_name.encode()).hexdigest()
-                    print(f"Generated kaspi_id for seller {seller_name}: {seller_kaspi_id}")
-                else:
-                    seller_kaspi_id = str(seller_kaspi_id)
                 
-                seller = db.query(Seller).filter(
-                    (Seller.kaspi_id == seller_kaspi_id) | (Seller.name == seller_name)
-                ).first()
+                if item["error"] is None:
+                    try:
+                        product = ProductService.save_parsed_product(db, item["data"], history_writer)
+                        result["product_id"] = product.id
+                        if job_id:
+                            await ProductService._mark_job_completed(db, job_id, product)
+                    except Exception as e:
+                        db.rollback()
+                        result["error"] = str(e)
                 
-                if not seller:
-                    seller = Seller(
-                        kaspi_id=seller_kaspi_id,
-                        name=seller_name,
-                        rating=offer_data.get("rating"),
-                        reviews_count=offer_data.get("reviews_count", 0)
-                    )
-                    db.add(seller)
-                    db.commit()
-                    db.refresh(seller)
+                if result["error"] is not None:
+                    failed_parsing.inc()
+                    logger.warning(f"Batch parse failed for {item['url']}: {result['error']}")
+                    if job_id:
+                        await ProductService._mark_job_failed(db, job_id, result["error"])
                 else:
-                    if not seller.kaspi_id.startswith("seller_") and seller.kaspi_id != seller_kaspi_id:
-                        print(f"Updating kaspi_id for existing seller {seller.name} from {seller.kaspi_id} to {seller_kaspi_id}")
-                        seller.kaspi_id = seller_kaspi_id
-                
-                if offer_data.get("rating"):
-                    seller.rating = offer_data["rating"]
-                if offer_data.get("reviews_count"):
-                    seller.reviews_count = offer_data["reviews_count"]
-                
-                offer = Offer(
-                    product_id=product.id,
-                    seller_id=seller.id,
-                    price=offer_data["price"],
-                    position=offer_data.get("position"),
-                    in_stock=offer_data.get("in_stock", True),
-                    parsed_at=parse_timestamp
-                )
-                db.add(offer)
+                    successful_parsing.inc()
                 
-                price_history_new = PriceHistory(
-                    product_id=product.id,
-                    seller_id=seller.id,
-                    price=offer_data["price"],
-                    position=offer_data.get("position"),
-                    recorded_at=parse_timestamp
+                yield result
+        finally:
+            if in_flight:
+                active_jobs.dec(len(in_flight))
+            if should_close:
+                db.close()
+    
+    @staticmethod
+    async def run_parse_jobs(urls: List[str], job_ids: List[int]) -> List[Dict]:
+        return [result async for result in ProductService.parse_and_save_many(urls, job_ids)]
+    
+    @staticmethod
+    async def _mark_job_started(db: Session, job_id: int):
+        job = db.query(ParsingJob).filter(ParsingJob.id == job_id).first()
+        if job:
+            job.status = JobStatus.PARSING
+            job.started_at = datetime.utcnow()
+            db.commit()
+            from app.api.v1.websocket import notify_job_status
+            await notify_job_status(job_id, "parsing", "Парсинг начат")
+    
+    @staticmethod
+    async def _mark_job_completed(db: Session, job_id: int, product: Product):
+        job = db.query(ParsingJob).filter(ParsingJob.id == job_id).first()
+        if job:
+            job.status = JobStatus.COMPLETED
+            job.kaspi_product_id = product.kaspi_id
+            job.completed_at = datetime.utcnow()
+            db.commit()
+            from app.api.v1.websocket import notify_job_status, notify_product_updated, notify_job_completed
+            await notify_job_status(job_id, "completed", "Парсинг завершен успешно")
+            await notify_job_completed(job_id, "completed")
+            await notify_product_updated(product.id)
+    
+    @staticmethod
+    async def _mark_job_failed(db: Session, job_id: int, error):
+        job = db.query(ParsingJob).filter(ParsingJob.id == job_id).first()
+        if job:
+            job.status = JobStatus.FAILED
+            job.error_message = str(error)
+            job.completed_at = datetime.utcnow()
+            db.commit()
+            from app.api.v1.websocket import notify_job_status, notify_job_completed
+            await notify_job_status(job_id, "failed", f"Ошибка: {str(error)}")
+            await notify_job_completed(job_id, "failed")
+    
+    @staticmethod
+    def save_parsed_product(db: Session, data: Dict, history_writer: Optional[BulkWriter] = None) -> Product:
+        kaspi_id = data["kaspi_id"]
+        
+        product = db.query(Product).filter(Product.kaspi_id == kaspi_id).first()
+        
+        if not product:
+            product = Product(
+                kaspi_id=kaspi_id,
+                name=data.get("name"),
+                category=data.get("category")
+            )
+            db.add(product)
+            db.flush()
+        
+        parse_timestamp = datetime.utcnow()
+        fingerprint = data.get("fingerprint")
+        
+        if fingerprint and product.offers_fingerprint == fingerprint and product.snapshot is not None:
+            product.last_verified_at = parse_timestamp
+            product.updated_at = Product.updated_at
+            StatsService.observe(db, product.id, product.snapshot, parse_timestamp)
+            db.commit()
+            if not redis_client.touch_product_cache(str(product.id)):
+                snapshot = product.snapshot
+                ProductService._cache_product(
+                    product.id, snapshot.top_offers or [], snapshot.price_buckets, snapshot.prices or []
                 )
-                db.add(price_history_new)
+            unchanged_snapshots.inc()
+            return product
+        
+        product.name = data.get("name") or product.name
+        product.category = data.get("category") or product.category
+        product.updated_at = parse_timestamp
+        product.offers_fingerprint = fingerprint
+        product.last_verified_at = parse_timestamp
+        
+        current_offers = {
+            offer.seller_id: offer
+            for offer in db.query(Offer).filter(Offer.product_id == product.id).all()
+        }
+        seen_sellers = set()
+        history_rows = []
+        snapshot_offers = []
+        
+        top_offers = data["offers"][:settings.TOP_SELLERS_COUNT]
+        
+        seller_ids, seller_rows = ProductService._resolve_sellers(db, top_offers)
+        
+        for offer_data in top_offers:
+            seller_kaspi_id = ProductService._seller_kaspi_id(offer_data)
+            seller_id = seller_ids[seller_kaspi_id]
+            if seller_id in seen_sellers:
+                continue
+            seen_sellers.add(seller_id)
             
-            db.commit()
+            price = offer_data["price"]
+            position = offer_data.get("position")
+            in_stock = offer_data.get("in_stock", True)
             
-            offers_for_cache = [
-                {
-                    "price": o.price,
-                    "seller_name": o.seller.name,
-                    "seller_rating": o.seller.rating,
-                    "seller_reviews_count": o.seller.reviews_count,
-                    "position": o.position,
-                    "in_stock": o.in_stock
-                }
-                for o in product.offers
-            ]
-            redis_client.set_product_offers(str(product.id), offers_for_cache)
-            redis_client.set_price_buckets(str(product.id), data["price_buckets"])
+            _, seller_rating, seller_reviews_count = seller_rows[seller_kaspi_id]
+            snapshot_offers.append({
+                "price": price,
+                "seller_name": offer_data["seller_name"],
+                "seller_rating": seller_rating,
+                "seller_reviews_count": seller_reviews_count,
+                "position": position,
+                "in_stock": in_stock
+            })
             
-            if job_id:
-                job = db.query(ParsingJob).filter(ParsingJob.id == job_id).first()
-                if job:
-                    job.status = JobStatus.COMPLETED
-                    job.kaspi_product_id = kaspi_id
-                    job.completed_at = datetime.utcnow()
-                    db.commit()
-                    from app.api.v1.websocket import notify_job_status, notify_product_updated, notify_job_completed
-                    await notify_job_status(job_id, "completed", "Парсинг завершен успешно")
-                    await notify_job_completed(job_id, "completed")
-                    await notify_product_updated(product.id)
+            offer = current_offers.get(seller_id)
+            if offer is None:
+                db.add(Offer(
+                    product_id=product.id,
+                    seller_id=seller_id,
+                    price=price,
+                    position=position,
+                    in_stock=in_stock,
+                    parsed_at=parse_timestamp
+                ))
+                history_changed = True
+            else:
+                history_changed = offer.price != price or offer.position != position
+                offer.price = price
+                offer.position = position
+                offer.in_stock = in_stock
+                offer.parsed_at = parse_timestamp
             
-            return product
+            if history_changed:
+                history_rows.append({
+                    "product_id": product.id,
+                    "seller_id": seller_id,
+                    "price": price,
+                    "position": position,
+                    "recorded_at": parse_timestamp
+                })
+        
+        for seller_id, offer in current_offers.items():
+            if seller_id not in seen_sellers:
+                db.delete(offer)
+        
+        snapshot = SnapshotService.save(
+            db, product.id, data["offers"], snapshot_offers, data["price_buckets"], fingerprint, parse_timestamp
+        )
+        StatsService.observe(db, product.id, snapshot, parse_timestamp)
+        
+        if history_writer is None:
+            history_writer = new_history_writer()
+        db.flush()
+        history_writer.extend(history_rows)
+        history_writer.flush(db)
+        
+        db.commit()
+        seller_cache.update(seller_rows)
+        
+        ProductService._cache_product(
+            product.id, snapshot_offers, data["price_buckets"], [o["price"] for o in data["offers"] if o.get("price")]
+        )
+        
+        return product
+    
+    @staticmethod
+    def _cache_product(product_id: int, offers: List[Dict], buckets: Optional[Dict], prices: List[float]):
+        redis_client.set_product_offers(str(product_id), offers)
+        if buckets is not None:
+            redis_client.set_price_buckets(str(product_id), buckets)
+        redis_client.set_price_index(redis_client.price_index_key(str(product_id)), prices)
+        redis_client.set_all_prices(str(product_id), prices)
+        redis_client.publish_invalidation(f"product:{product_id}")
+    
+    @staticmethod
+    def _seller_kaspi_id(offer_data: Dict) -> str:
+        seller_kaspi_id = offer_data.get("seller_id")
+        if not seller_kaspi_id:
+            return hashlib.md5(offer_data["seller_name"].encode()).hexdigest()
+        return str(seller_kaspi_id)
+    
+    @staticmethod
+    def _resolve_sellers(db: Session, offers: List[Dict]) -> Tuple[Dict[str, int], Dict[str, Tuple]]:
+        wanted: Dict[str, Dict] = {}
+        for offer_data in offers:
+            seller_kaspi_id = ProductService._seller_kaspi_id(offer_data)
+            if seller_kaspi_id not in wanted:
+                wanted[seller_kaspi_id] = {
+                    "name": offer_data["seller_name"],
+                    "rating": offer_data.get("rating"),
+                    "reviews_count": offer_data.get("reviews_count") or 0
+                }
+        
+        known: Dict[str, Tuple] = {}
+        for seller_kaspi_id in wanted:
+            cached = seller_cache.get(seller_kaspi_id)
+            if cached is not None:
+                known[seller_kaspi_id] = cached
+        
+        by_id_updates: Dict[int, Dict] = {}
+        missing = [k for k in wanted if k not in known]
+        if missing:
+            names = list({wanted[k]["name"] for k in missing})
+            rows = db.query(
+                Seller.id, Seller.kaspi_id, Seller.name, Seller.rating, Seller.reviews_count
+            ).filter(
+                or_(Seller.kaspi_id.in_(missing), Seller.name.in_(names))
+            ).all()
+            by_kaspi_id = {row.kaspi_id: row for row in rows}
+            by_name = {}
+            for row in rows:
+                by_name.setdefault(row.name, row)
             
-        except Exception as e:
-            db.rollback()
-            if job_id:
-                job = db.query(ParsingJob).filter(ParsingJob.id == job_id).first()
-                if job:
-                    job.status = JobStatus.FAILED
-                    job.error_message = str(e)
-                    job.completed_at = datetime.utcnow()
-                    db.commit()
-                    from app.api.v1.websocket import notify_job_status, notify_job_completed
-                    await notify_job_status(job_id, "failed", f"Ошибка: {str(e)}")
-                    await notify_job_completed(job_id, "failed")
-            raise
-        finally:
-            if should_close:
-                db.close()
+            for seller_kaspi_id in missing:
+                row = by_kaspi_id.get(seller_kaspi_id)
+                if row is not None:
+                    known[seller_kaspi_id] = (row.id, row.rating, row.reviews_count)
+                    continue
+                
+                row = by_name.get(wanted[seller_kaspi_id]["name"])
+                if row is None or row.id in by_id_updates:
+                    continue
+                update = {}
+                if not row.kaspi_id.startswith("seller_"):
+                    print(f"Updating kaspi_id for existing seller {row.name} from {row.kaspi_id} to {seller_kaspi_id}")
+                    update["kaspi_id"] = seller_kaspi_id
+                by_id_updates[row.id] = update
+                known[seller_kaspi_id] = (row.id, row.rating, row.reviews_count)
+        
+        upserts = []
+        for seller_kaspi_id, info in wanted.items():
+            if seller_kaspi_id not in known:
+                upserts.append({
+                    "kaspi_id": seller_kaspi_id,
+                    "name": info["name"],
+                    "rating": info["rating"],
+                    "reviews_count": info["reviews_count"]
+                })
+                continue
+            
+            seller_id, rating, reviews_count = known[seller_kaspi_id]
+            new_rating = info["rating"] or rating
+            new_reviews_count = info["reviews_count"] or reviews_count
+            known[seller_kaspi_id] = (seller_id, new_rating, new_reviews_count)
+            if seller_id in by_id_updates:
+                if new_rating != rating or new_reviews_count != reviews_count or by_id_updates[seller_id]:
+                    by_id_updates[seller_id].update(rating=new_rating, reviews_count=new_reviews_count)
+            elif new_rating != rating or new_reviews_count != reviews_count:
+                upserts.append({
+                    "kaspi_id": seller_kaspi_id,
+                    "name": info["name"],
+                    "rating": new_rating,
+                    "reviews_count": new_reviews_count
+                })
+        
+        for seller_id, update in by_id_updates.items():
+            if update:
+                update["updated_at"] = func.now()
+                db.query(Seller).filter(Seller.id == seller_id).update(update, synchronize_session=False)
+        
+        if upserts:
+            insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+            stmt = insert(Seller).values(upserts)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Seller.kaspi_id],
+                set_={
+                    "rating": stmt.excluded.rating,
+                    "reviews_count": stmt.excluded.reviews_count,
+                    "updated_at": func.now()
+                }
+            ).returning(Seller.id, Seller.kaspi_id, Seller.rating, Seller.reviews_count)
+            for row in db.execute(stmt):
+                known[row.kaspi_id] = (row.id, row.rating, row.reviews_count)
+        
+        seller_ids = {seller_kaspi_id: entry[0] for seller_kaspi_id, entry in known.items()}
+        return seller_ids, known
     
     @staticmethod
     def get_product(db: Session, product_id: int) -> Optional[Product]:
@@ -191,14 +441,48 @@ class ProductService:
             joinedload(Product.offers).joinedload(Offer.seller)
         ).filter(Product.kaspi_id == kaspi_id).first()
     
+    @staticmethod
+    def get_product_with_snapshot(db: Session, product_id: int) -> Optional[Product]:
+        return db.query(Product).options(
+            joinedload(Product.snapshot)
+        ).filter(Product.id == product_id).first()
+    
     @staticmethod
     def list_products(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None) -> List[Product]:
         query = db.query(Product).options(
-            joinedload(Product.offers).joinedload(Offer.seller)
+            joinedload(Product.offers).joinedload(Offer.seller),
+            joinedload(Product.snapshot)
         )
         if search:
-            query = query.filter(
-                (Product.name.ilike(f"%{search}%")) | 
-                (Product.category.ilike(f"%{search}%"))
-            )
+            query = SearchService.rank_products(db, query, search)
         return query.offset(skip).limit(limit).all()
+    
+    @staticmethod
+    def list_products_page(
+        db: Session,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        search: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        activity = func.coalesce(Product.updated_at, Product.created_at)
+        query = db.query(
+            Product.id,
+            Product.kaspi_id,
+            Product.name,
+            Product.category,
+            Product.created_at,
+            Product.updated_at,
+            Product.last_verified_at,
+            ProductSnapshot.offers_count.label("total_offers_count"),
+            ProductSnapshot.min_price,
+            ProductSnapshot.max_price,
+            activity.label("activity_at")
+        ).outerjoin(ProductSnapshot, ProductSnapshot.product_id == Product.id)
+        if search:
+            query = SearchService.filter_products(db, query, search)
+        
+        rows, next_cursor = keyset_paginate(
+            query, activity, Product.id, limit, cursor,
+            key=lambda row: (row.activity_at, row.id)
+        )
+        return [dict(row._mapping) for row in rows], next_cursor
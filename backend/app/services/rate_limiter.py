@@ -0,0 +1,160 @@
+import asyncio
+import time
+from typing import Tuple
+from app.core.config import settings
+from app.core.redis_client import async_redis
+from app.core.metrics import upstream_rate_limit
+import logging
+
+logger = logging.getLogger(__name__)
+
+REDIS_RETRY_SECONDS = 30
+
+ACQUIRE_SCRIPT = """
+local now_t = redis.call('TIME')
+local now = tonumber(now_t[1]) + tonumber(now_t[2]) / 1000000
+local initial = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate')
+local rate = tonumber(state[3]) or initial
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - 1
+local wait = 0
+if tokens < 0 then
+    wait = -tokens / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now, 'rate', rate)
+redis.call('EXPIRE', KEYS[1], 3600)
+return {tostring(wait), tostring(rate)}
+"""
+
+FEEDBACK_SCRIPT = """
+local now_t = redis.call('TIME')
+local now = tonumber(now_t[1]) + tonumber(now_t[2]) / 1000000
+local kind = ARGV[1]
+local initial = tonumber(ARGV[2])
+local min_rate = tonumber(ARGV[3])
+local max_rate = tonumber(ARGV[4])
+local increase = tonumber(ARGV[5])
+local factor = tonumber(ARGV[6])
+local cooldown = tonumber(ARGV[7])
+local state = redis.call('HMGET', KEYS[1], 'rate', 'cut_at')
+local rate = tonumber(state[1]) or initial
+local cut_at = tonumber(state[2]) or 0
+if kind == 'increase' then
+    rate = math.min(max_rate, rate + increase / rate)
+elseif now - cut_at >= cooldown then
+    rate = math.max(min_rate, rate * factor)
+    redis.call('HSET', KEYS[1], 'cut_at', now)
+end
+redis.call('HSET', KEYS[1], 'rate', rate)
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(rate)
+"""
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, name: str = "kaspi"):
+        self.key = f"ratelimit:{name}"
+        self._redis = None
+        self._redis_retry_at = 0.0
+        self._acquire_script = None
+        self._feedback_script = None
+        self._rate = settings.KASPI_RATE_INITIAL
+        self._tokens = float(settings.KASPI_RATE_BURST)
+        self._updated_at = time.monotonic()
+        self._cut_at = 0.0
+        upstream_rate_limit.set(self._rate)
+
+    def _get_redis(self):
+        if time.monotonic() < self._redis_retry_at:
+            return None
+        client = async_redis.client
+        if self._redis is not client:
+            self._redis = client
+            self._acquire_script = client.register_script(ACQUIRE_SCRIPT)
+            self._feedback_script = client.register_script(FEEDBACK_SCRIPT)
+        return client
+
+    def _redis_failed(self, e: Exception):
+        logger.warning(f"Rate limiter Redis unavailable, using local bucket for {REDIS_RETRY_SECONDS}s: {e}")
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+
+    def _acquire_local(self) -> Tuple[float, float]:
+        now = time.monotonic()
+        elapsed = max(0.0, now - self._updated_at)
+        self._tokens = min(float(settings.KASPI_RATE_BURST), self._tokens + elapsed * self._rate) - 1
+        self._updated_at = now
+        wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        return wait, self._rate
+
+    def _feedback_local(self, kind: str) -> float:
+        # Additive increase is spread over a second's worth of responses, so the rate grows by
+        # KASPI_RATE_INCREASE per second; cuts are applied at most once per cooldown window.
+        now = time.monotonic()
+        if kind == "increase":
+            self._rate = min(settings.KASPI_RATE_MAX, self._rate + settings.KASPI_RATE_INCREASE / self._rate)
+        elif now - self._cut_at >= settings.KASPI_RATE_DECREASE_COOLDOWN:
+            self._rate = max(settings.KASPI_RATE_MIN, self._rate * settings.KASPI_RATE_DECREASE_FACTOR)
+            self._cut_at = now
+        return self._rate
+
+    async def acquire(self):
+        if not settings.KASPI_RATE_LIMIT_ENABLED:
+            return
+
+        wait = None
+        if self._get_redis() is not None:
+            try:
+                wait_raw, rate_raw = await self._acquire_script(
+                    keys=[self.key],
+                    args=[settings.KASPI_RATE_INITIAL, settings.KASPI_RATE_BURST],
+                )
+                wait, rate = float(wait_raw), float(rate_raw)
+            except Exception as e:
+                self._redis_failed(e)
+        if wait is None:
+            wait, rate = self._acquire_local()
+
+        upstream_rate_limit.set(rate)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _feedback(self, kind: str):
+        if not settings.KASPI_RATE_LIMIT_ENABLED:
+            return
+
+        rate = None
+        if self._get_redis() is not None:
+            try:
+                rate = float(await self._feedback_script(
+                    keys=[self.key],
+                    args=[
+                        kind,
+                        settings.KASPI_RATE_INITIAL,
+                        settings.KASPI_RATE_MIN,
+                        settings.KASPI_RATE_MAX,
+                        settings.KASPI_RATE_INCREASE,
+                        settings.KASPI_RATE_DECREASE_FACTOR,
+                        settings.KASPI_RATE_DECREASE_COOLDOWN,
+                    ],
+                ))
+            except Exception as e:
+                self._redis_failed(e)
+        if rate is None:
+            rate = self._feedback_local(kind)
+
+        upstream_rate_limit.set(rate)
+        if kind == "decrease":
+            logger.info(f"Kaspi rate limit reduced to {rate:.2f} req/s")
+
+    async def on_success(self, latency: float):
+        if latency <= settings.KASPI_RATE_SLOW_SECONDS:
+            await self._feedback("increase")
+
+    async def on_throttled(self):
+        await self._feedback("decrease")
+
+
+rate_limiter = AdaptiveRateLimiter()
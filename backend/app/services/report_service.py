@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from app.models.product import Product, Offer, PriceHistory, Seller
 from app.services.product_service import ProductService
 from app.services.analytics import AnalyticsService
+from app.services.retention_service import RetentionService
 from app.services.ai_service import AIService
 from app.core.minio_client import minio_client
 from openpyxl import Workbook
@@ -44,17 +45,14 @@ class ReportService:
         ws2.append(["Дата", "Продавец", "Цена", "Позиция"])
         
         cutoff_date = datetime.utcnow() - timedelta(days=30)
-        history = db.query(PriceHistory).filter(
-            PriceHistory.product_id == product_id,
-            PriceHistory.recorded_at >= cutoff_date
-        ).order_by(PriceHistory.recorded_at).all()
+        history = RetentionService.get_history(db, product_id, cutoff_date)
         
         for record in history:
             ws2.append([
-                record.recorded_at.strftime("%Y-%m-%d"),
-                record.seller.name if record.seller else "-",
-                record.price,
-                record.position or "-"
+                record["recorded_at"].strftime("%Y-%m-%d"),
+                record["seller_name"],
+                record["price"],
+                record["position"] or "-"
             ])
         
         ws3 = wb.create_sheet("Статистика")
@@ -151,40 +149,27 @@ class ReportService:
 
     @staticmethod
     def generate_price_comparison_excel(db: Session, product_id: int, date1: date, date2: date) -> str:
-        from datetime import datetime as dt
-        from sqlalchemy import and_
-        
         product = ProductService.get_product(db, product_id)
         if not product:
             raise ValueError("Product not found")
         
         def get_date_data(target_date: date):
-            start_datetime = dt.combine(target_date, dt.min.time())
-            end_datetime = dt.combine(target_date, dt.max.time())
-            
-            history_records = db.query(PriceHistory).filter(
-                and_(
-                    PriceHistory.product_id == product_id,
-                    PriceHistory.recorded_at >= start_datetime,
-                    PriceHistory.recorded_at <= end_datetime
-                )
-            ).order_by(PriceHistory.recorded_at.desc()).all()
+            history_records = RetentionService.get_day_history(db, product_id, target_date)[::-1]
             
             if not history_records:
                 return None
             
-            latest_time = history_records[0].recorded_at
-            latest_records = [r for r in history_records if r.recorded_at.date() == latest_time.date() and abs((r.recorded_at - latest_time).total_seconds()) < 3600]
+            latest_time = history_records[0]["recorded_at"]
+            latest_records = [r for r in history_records if r["recorded_at"].date() == latest_time.date() and abs((r["recorded_at"] - latest_time).total_seconds()) < 3600]
             
             offers = []
             for record in latest_records:
-                seller = db.query(Seller).filter(Seller.id == record.seller_id).first()
                 offers.append({
-                    "seller_id": record.seller_id,
-                    "seller_name": seller.name if seller else "Unknown",
-                    "price": record.price,
-                    "position": record.position,
-                    "recorded_at": record.recorded_at.isoformat()
+                    "seller_id": record["seller_id"],
+                    "seller_name": record["seller_name"],
+                    "price": record["price"],
+                    "position": record["position"],
+                    "recorded_at": record["recorded_at"].isoformat()
                 })
             
             if not offers:
@@ -304,17 +289,14 @@ class ReportService:
         
         price_history_data = []
         cutoff_date = datetime.utcnow() - timedelta(days=90)
-        history = db.query(PriceHistory).filter(
-            PriceHistory.product_id == product_id,
-            PriceHistory.recorded_at >= cutoff_date
-        ).order_by(PriceHistory.recorded_at).all()
+        history = RetentionService.get_history(db, product_id, cutoff_date)
         
         for record in history:
             price_history_data.append({
-                "date": record.recorded_at.date().isoformat(),
-                "price": record.price,
-                "position": record.position,
-                "seller_name": record.seller.name if record.seller else "Unknown"
+                "date": record["recorded_at"].date().isoformat(),
+                "price": record["price"],
+                "position": record["position"],
+                "seller_name": record["seller_name"]
             })
         
         price_dist = AnalyticsService.calculate_price_distribution(offers_data)
@@ -0,0 +1,210 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from datetime import date, datetime, timedelta, timezone
+from app.core.config import settings
+from app.models.product import PriceHistory, Seller
+from app.models.history import PriceHistoryHourly, PriceHistoryDaily
+import logging
+
+logger = logging.getLogger(__name__)
+
+TIER_RAW = "raw"
+TIER_HOURLY = "hourly"
+TIER_DAILY = "daily"
+
+ROLLUP_HOURLY_SQL = """
+INSERT INTO price_history_hourly
+    (product_id, seller_id, bucket, min_price, max_price, last_price, last_position, samples)
+SELECT product_id, seller_id, date_trunc('hour', recorded_at),
+       min(price), max(price),
+       (array_agg(price ORDER BY recorded_at DESC))[1],
+       (array_agg(position ORDER BY recorded_at DESC))[1],
+       count(*)
+FROM price_history
+WHERE recorded_at >= :since
+GROUP BY product_id, seller_id, date_trunc('hour', recorded_at)
+ON CONFLICT (product_id, seller_id, bucket) DO UPDATE SET
+    min_price = EXCLUDED.min_price,
+    max_price = EXCLUDED.max_price,
+    last_price = EXCLUDED.last_price,
+    last_position = EXCLUDED.last_position,
+    samples = EXCLUDED.samples
+"""
+
+ROLLUP_DAILY_SQL = """
+INSERT INTO price_history_daily
+    (product_id, seller_id, bucket, min_price, max_price, last_price, last_position, samples)
+SELECT product_id, seller_id, date_trunc('day', bucket),
+       min(min_price), max(max_price),
+       (array_agg(last_price ORDER BY bucket DESC))[1],
+       (array_agg(last_position ORDER BY bucket DESC))[1],
+       sum(samples)
+FROM price_history_hourly
+WHERE bucket >= :since
+GROUP BY product_id, seller_id, date_trunc('day', bucket)
+ON CONFLICT (product_id, seller_id, bucket) DO UPDATE SET
+    min_price = EXCLUDED.min_price,
+    max_price = EXCLUDED.max_price,
+    last_price = EXCLUDED.last_price,
+    last_position = EXCLUDED.last_position,
+    samples = EXCLUDED.samples
+"""
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class RetentionService:
+    @staticmethod
+    def select_tier(start: datetime, end: datetime, now: datetime = None) -> str:
+        now = _utc(now or datetime.now(timezone.utc))
+        start = _utc(start)
+        span_days = (_utc(end) - start).days
+        
+        if span_days <= settings.HISTORY_RAW_MAX_SPAN_DAYS and start >= now - timedelta(days=settings.HISTORY_RAW_RETENTION_DAYS):
+            return TIER_RAW
+        if span_days <= settings.HISTORY_HOURLY_MAX_SPAN_DAYS and start >= now - timedelta(days=settings.HISTORY_HOURLY_RETENTION_DAYS):
+            return TIER_HOURLY
+        return TIER_DAILY
+    
+    @staticmethod
+    def rollups_available(db: Session) -> bool:
+        return db.get_bind().dialect.name == "postgresql"
+    
+    @staticmethod
+    def get_history(
+        db: Session,
+        product_id: int,
+        start: datetime,
+        end: Optional[datetime] = None,
+        tier: Optional[str] = None
+    ) -> List[Dict]:
+        end = end or datetime.now(timezone.utc)
+        if tier is not None:
+            return RetentionService._query_tier(db, product_id, start, end, tier)
+        
+        tier = RetentionService.select_tier(start, end)
+        if tier != TIER_RAW and RetentionService.rollups_available(db):
+            history = RetentionService._query_tier(db, product_id, start, end, tier)
+            if history:
+                return history
+        return RetentionService._query_tier(db, product_id, start, end, TIER_RAW)
+    
+    @staticmethod
+    def get_day_history(db: Session, product_id: int, day: date) -> List[Dict]:
+        start = datetime.combine(day, datetime.min.time())
+        end = datetime.combine(day, datetime.max.time())
+        history = RetentionService.get_history(db, product_id, start, end, tier=TIER_RAW)
+        if not history and RetentionService.rollups_available(db):
+            history = RetentionService.get_history(db, product_id, start, end, tier=TIER_HOURLY)
+        return history
+    
+    @staticmethod
+    def _query_tier(db: Session, product_id: int, start: datetime, end: datetime, tier: str) -> List[Dict]:
+        if tier == TIER_RAW:
+            rows = db.query(PriceHistory, Seller.name).outerjoin(
+                Seller, Seller.id == PriceHistory.seller_id
+            ).filter(
+                PriceHistory.product_id == product_id,
+                PriceHistory.recorded_at >= start,
+                PriceHistory.recorded_at <= end
+            ).order_by(PriceHistory.recorded_at).all()
+            
+            return [
+                {
+                    "seller_id": record.seller_id,
+                    "seller_name": seller_name or "Unknown",
+                    "price": record.price,
+                    "min_price": record.price,
+                    "max_price": record.price,
+                    "position": record.position,
+                    "recorded_at": record.recorded_at,
+                } for record, seller_name in rows
+            ]
+        
+        model = PriceHistoryHourly if tier == TIER_HOURLY else PriceHistoryDaily
+        rows = db.query(model, Seller.name).outerjoin(
+            Seller, Seller.id == model.seller_id
+        ).filter(
+            model.product_id == product_id,
+            model.bucket >= start,
+            model.bucket <= end
+        ).order_by(model.bucket).all()
+        
+        return [
+            {
+                "seller_id": record.seller_id,
+                "seller_name": seller_name or "Unknown",
+                "price": record.last_price,
+                "min_price": record.min_price,
+                "max_price": record.max_price,
+                "position": record.last_position,
+                "recorded_at": record.bucket,
+            } for record, seller_name in rows
+        ]
+    
+    @staticmethod
+    def _watermark(db: Session, table: str) -> Optional[datetime]:
+        return db.execute(text(f"SELECT max(bucket) FROM {table}")).scalar()
+    
+    @staticmethod
+    def rollup(db: Session) -> Dict[str, int]:
+        lookback = timedelta(hours=settings.HISTORY_ROLLUP_LOOKBACK_HOURS)
+        
+        hourly_since = EPOCH
+        hourly_watermark = RetentionService._watermark(db, "price_history_hourly")
+        if hourly_watermark is not None:
+            hourly_since = _utc(hourly_watermark) - lookback
+        hourly = db.execute(text(ROLLUP_HOURLY_SQL), {"since": hourly_since}).rowcount
+        
+        daily_since = EPOCH
+        daily_watermark = RetentionService._watermark(db, "price_history_daily")
+        if daily_watermark is not None:
+            hourly_day = hourly_since.replace(hour=0, minute=0, second=0, microsecond=0)
+            daily_since = min(_utc(daily_watermark), hourly_day)
+        daily = db.execute(text(ROLLUP_DAILY_SQL), {"since": daily_since}).rowcount
+        
+        db.commit()
+        return {"hourly": hourly, "daily": daily}
+    
+    @staticmethod
+    def compact(db: Session, now: datetime = None) -> Dict[str, int]:
+        now = _utc(now or datetime.now(timezone.utc))
+        
+        hourly_watermark = RetentionService._watermark(db, "price_history_hourly")
+        raw_deleted = 0
+        if hourly_watermark is not None:
+            raw_cutoff = min(now - timedelta(days=settings.HISTORY_RAW_RETENTION_DAYS), hourly_watermark)
+            raw_deleted = db.execute(
+                text("DELETE FROM price_history WHERE recorded_at < :cutoff"),
+                {"cutoff": raw_cutoff}
+            ).rowcount
+        
+        daily_watermark = RetentionService._watermark(db, "price_history_daily")
+        hourly_deleted = 0
+        if daily_watermark is not None:
+            hourly_cutoff = min(now - timedelta(days=settings.HISTORY_HOURLY_RETENTION_DAYS), daily_watermark)
+            hourly_deleted = db.execute(
+                text("DELETE FROM price_history_hourly WHERE bucket < :cutoff"),
+                {"cutoff": hourly_cutoff}
+            ).rowcount
+        
+        db.commit()
+        return {"raw": raw_deleted, "hourly": hourly_deleted}
+    
+    @staticmethod
+    def run(db: Session) -> Dict[str, Dict[str, int]]:
+        if db.get_bind().dialect.name != "postgresql":
+            logger.warning("Price history retention requires PostgreSQL, skipping")
+            return {"rolled_up": {}, "deleted": {}}
+        
+        rolled_up = RetentionService.rollup(db)
+        deleted = RetentionService.compact(db)
+        logger.info(f"Price history retention: rolled up {rolled_up}, deleted {deleted}")
+        return {"rolled_up": rolled_up, "deleted": deleted}
@@ -3,11 +3,15 @@ from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy.orm import Session
 from app.core.database import SessionLocal
-from app.services.product_service import ProductService
-from app.models.product import Product, PriceHistory
+from app.services.product_service import ProductService, seller_cache, new_history_writer
+from app.models.product import Product, PriceHistory, ProductSnapshot
 from app.models.analytics import AnalyticsDaily
 from app.models.scheduler import SchedulerConfig
-from app.services.analytics import AnalyticsService
+from app.services.batch_analytics import BatchAnalytics, OfferBatch
+from app.services.partition_service import PartitionService
+from app.services.retention_service import RetentionService
+from app.services.stats_service import StatsService
+from app.services.aggregation_service import AggregationService
 from app.core.redis_client import redis_client
 from app.core.config import settings
 from datetime import date, datetime, timedelta
@@ -20,21 +24,19 @@ scheduler = AsyncIOScheduler()
 async def daily_price_update():
     db = SessionLocal()
     try:
+        seller_cache.clear()
         products = db.query(Product).all()
+        urls = [f"https://kaspi.kz/shop/p/{product.kaspi_id}/" for product in products]
         updated_products = []
+        history_writer = new_history_writer()
         
-        for product in products:
-            try:
-                updated_product = await ProductService.parse_and_save_product(
-                    f"https://kaspi.kz/shop/p/{product.kaspi_id}/", 
-                    None, 
-                    db
-                )
-                updated_products.append(updated_product.id)
-            except Exception as e:
-                print(f"Error updating product {product.id}: {e}")
-                db.rollback()
+        async for result in ProductService.parse_and_save_many(urls, db=db, history_writer=history_writer):
+            if result["error"]:
+                print(f"Error updating product {result['url']}: {result['error']}")
                 continue
+            updated_products.append(result["product_id"])
+        
+        print(f"Price update finished: {len(updated_products)}/{len(urls)} products, history {history_writer.summary()}")
         
         if updated_products:
             from app.api.v1.websocket import manager
@@ -50,40 +52,64 @@ async def daily_price_update():
 async def daily_analytics_aggregation(target_date: date = None):
     db = SessionLocal()
     try:
+        today = target_date or datetime.utcnow().date()
+        
+        if settings.ANALYTICS_AGGREGATION_MODE == "sql" and AggregationService.is_supported(db):
+            try:
+                written = AggregationService.aggregate_daily(db, today)
+                print(f"Daily analytics aggregated in SQL: {written} products")
+                return
+            except Exception as e:
+                print(f"Error in SQL analytics aggregation, falling back to per-product loop: {e}")
+                db.rollback()
+        
         products = db.query(Product).all()
-        today = target_date or date.today()
+        
+        accumulators = StatsService.get_for_date(db, today)
+        snapshots = {snapshot.product_id: snapshot for snapshot in db.query(ProductSnapshot).all()}
+        daily_metrics = {
+            product.id: StatsService.daily_metrics(accumulators[product.id], snapshots[product.id])
+            for product in products
+            if product.id in accumulators and product.id in snapshots
+        }
+        pending = [product for product in products if product.id not in daily_metrics]
+        
+        product_keys = [str(product.id) for product in products]
+        pending_keys = {str(product.id) for product in pending}
+        cached_offers = {}
+        cached_buckets = {}
+        for i in range(0, len(product_keys), 500):
+            chunk = product_keys[i:i + 500]
+            cached_buckets.update(redis_client.get_many_buckets(chunk))
+            chunk = [key for key in chunk if key in pending_keys]
+            if chunk:
+                cached_offers.update(redis_client.get_many_product_offers(chunk))
+        
+        offers_by_product = []
+        for product in pending:
+            offers_data = cached_offers.get(str(product.id))
+            if not offers_data:
+                offers_data = [
+                    {
+                        "price": o.price,
+                        "position": o.position,
+                        "in_stock": o.in_stock,
+                        "seller_rating": o.seller.rating if o.seller else None,
+                        "seller_name": o.seller.name if o.seller else ""
+                    } for o in product.offers
+                ]
+            offers_by_product.append(offers_data)
+        
+        batch_metrics = BatchAnalytics.calculate_daily_metrics(OfferBatch.from_offers(offers_by_product))
+        daily_metrics.update(zip((product.id for product in pending), batch_metrics))
         
         for product in products:
             try:
-                offers_data = redis_client.get_product_offers(str(product.id))
-                if not offers_data:
-                    offers_data = [
-                        {
-                            "price": o.price,
-                            "position": o.position,
-                            "in_stock": o.in_stock,
-                            "seller_rating": o.seller.rating if o.seller else None,
-                            "seller_name": o.seller.name if o.seller else ""
-                        } for o in product.offers
-                    ]
-                
-                if not offers_data:
+                stats = daily_metrics[product.id]
+                if not stats["offers_count"]:
                     continue
                 
-                stats = AnalyticsService.calculate_statistics(offers_data)
-                buckets = redis_client.get_price_buckets(str(product.id))
-                
-                sorted_offers = sorted([o for o in offers_data if o.get("price")], key=lambda x: x.get("price", 0))
-                
-                price_pos_1 = sorted_offers[0]["price"] if sorted_offers else None
-                price_pos_3 = sorted_offers[2]["price"] if len(sorted_offers) > 2 else None
-                price_pos_5 = sorted_offers[4]["price"] if len(sorted_offers) > 4 else None
-                price_pos_10 = sorted_offers[9]["price"] if len(sorted_offers) > 9 else None
-                
-                ratings = [o.get("seller_rating") for o in offers_data if o.get("seller_rating")]
-                avg_rating = sum(ratings) / len(ratings) if ratings else None
-                
-                in_stock_count = sum(1 for o in offers_data if o.get("in_stock", True))
+                buckets = cached_buckets.get(str(product.id))
                 
                 previous_day = db.query(AnalyticsDaily).filter(
                     AnalyticsDaily.product_id == product.id,
@@ -98,7 +124,7 @@ async def daily_analytics_aggregation(target_date: date = None):
                     delta_price = stats["avg_price"] - previous_day.avg_price
                     delta_percent = (delta_price / previous_day.avg_price * 100) if previous_day.avg_price > 0 else 0
                 
-                current_sellers = buckets.get("total_sellers_count") if buckets else len(offers_data)
+                current_sellers = buckets.get("total_sellers_count") if buckets else stats["offers_count"]
                 if previous_day and previous_day.sellers_count:
                     sellers_delta = current_sellers - previous_day.sellers_count
                 
@@ -113,17 +139,16 @@ async def daily_analytics_aggregation(target_date: date = None):
                     existing.avg_price = stats["avg_price"]
                     existing.median_price = stats["median_price"]
                     existing.price_std = stats["price_std"] or 0
-                    existing.offers_count = len(offers_data)
-                    unique_sellers = len(set(o.get("seller_name", "") for o in offers_data if o.get("seller_name")))
-                    existing.sellers_count = buckets.get("total_sellers_count") if buckets else (unique_sellers if unique_sellers > 0 else len(offers_data))
-                    existing.top_sellers_count = buckets.get("top_sellers_count") if buckets else len(offers_data)
-                    existing.estimated_total_sellers = buckets.get("total_sellers_count") if buckets else (len(offers_data) * 4)
-                    existing.price_position_1 = price_pos_1
-                    existing.price_position_3 = price_pos_3
-                    existing.price_position_5 = price_pos_5
-                    existing.price_position_10 = price_pos_10
-                    existing.avg_seller_rating = avg_rating
-                    existing.in_stock_count = in_stock_count
+                    existing.offers_count = stats["offers_count"]
+                    existing.sellers_count = buckets.get("total_sellers_count") if buckets else (stats["unique_sellers"] or stats["offers_count"])
+                    existing.top_sellers_count = buckets.get("top_sellers_count") if buckets else stats["offers_count"]
+                    existing.estimated_total_sellers = buckets.get("total_sellers_count") if buckets else (stats["offers_count"] * 4)
+                    existing.price_position_1 = stats["price_position_1"]
+                    existing.price_position_3 = stats["price_position_3"]
+                    existing.price_position_5 = stats["price_position_5"]
+                    existing.price_position_10 = stats["price_position_10"]
+                    existing.avg_seller_rating = stats["avg_seller_rating"]
+                    existing.in_stock_count = stats["in_stock_count"]
                     existing.delta_price = delta_price
                     existing.delta_percent = delta_percent
                     existing.sellers_delta = sellers_delta
@@ -136,16 +161,16 @@ async def daily_analytics_aggregation(target_date: date = None):
                         avg_price=stats["avg_price"],
                         median_price=stats["median_price"],
                         price_std=stats["price_std"] or 0,
-                        offers_count=len(offers_data),
-                        sellers_count=buckets.get("total_sellers_count") if buckets else (len(set(o.get("seller_name", "") for o in offers_data if o.get("seller_name"))) or len(offers_data)),
-                        top_sellers_count=buckets.get("top_sellers_count") if buckets else len(offers_data),
-                        estimated_total_sellers=buckets.get("total_sellers_count") if buckets else (len(offers_data) * 4),
-                        price_position_1=price_pos_1,
-                        price_position_3=price_pos_3,
-                        price_position_5=price_pos_5,
-                        price_position_10=price_pos_10,
-                        avg_seller_rating=avg_rating,
-                        in_stock_count=in_stock_count,
+                        offers_count=stats["offers_count"],
+                        sellers_count=buckets.get("total_sellers_count") if buckets else (stats["unique_sellers"] or stats["offers_count"]),
+                        top_sellers_count=buckets.get("top_sellers_count") if buckets else stats["offers_count"],
+                        estimated_total_sellers=buckets.get("total_sellers_count") if buckets else (stats["offers_count"] * 4),
+                        price_position_1=stats["price_position_1"],
+                        price_position_3=stats["price_position_3"],
+                        price_position_5=stats["price_position_5"],
+                        price_position_10=stats["price_position_10"],
+                        avg_seller_rating=stats["avg_seller_rating"],
+                        in_stock_count=stats["in_stock_count"],
                         delta_price=delta_price,
                         delta_percent=delta_percent,
                         sellers_delta=sellers_delta
@@ -161,6 +186,30 @@ async def daily_analytics_aggregation(target_date: date = None):
         db.close()
 
 
+async def price_history_maintenance():
+    db = SessionLocal()
+    try:
+        result = PartitionService.run_maintenance(db)
+        print(f"Price history partitions: created {result['created']}, detached {result['detached']}")
+    except Exception as e:
+        print(f"Error maintaining price history partitions: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+async def price_history_retention():
+    db = SessionLocal()
+    try:
+        result = RetentionService.run(db)
+        print(f"Price history retention: rolled up {result['rolled_up']}, deleted {result['deleted']}")
+    except Exception as e:
+        print(f"Error compacting price history: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
 def get_or_create_scheduler_config(db: Session, job_id: str) -> SchedulerConfig:
     config = db.query(SchedulerConfig).filter(SchedulerConfig.job_id == job_id).first()
     if not config:
@@ -171,6 +220,20 @@ def get_or_create_scheduler_config(db: Session, job_id: str) -> SchedulerConfig:
                 interval_hours=settings.PARSING_INTERVAL_HOURS,
                 interval_minutes=settings.PARSING_INTERVAL_MINUTES
             )
+        elif job_id == "price_history_retention":
+            config = SchedulerConfig(
+                job_id=job_id,
+                enabled=True,
+                interval_hours=1,
+                interval_minutes=0
+            )
+        elif job_id == "price_history_maintenance":
+            config = SchedulerConfig(
+                job_id=job_id,
+                enabled=True,
+                cron_hour=2,
+                cron_minute=30
+            )
         else:
             config = SchedulerConfig(
                 job_id=job_id,
@@ -228,6 +291,35 @@ def update_job_schedule(job_id: str, config: SchedulerConfig):
             id=job_id,
             replace_existing=True
         )
+    elif job_id == "price_history_maintenance":
+        if config.cron_hour is not None and config.cron_minute is not None:
+            cron_hour = min(config.cron_hour, 23)
+            trigger = CronTrigger(hour=cron_hour, minute=config.cron_minute)
+        else:
+            trigger = CronTrigger(hour=2, minute=30)
+        
+        scheduler.add_job(
+            price_history_maintenance,
+            trigger=trigger,
+            id=job_id,
+            replace_existing=True
+        )
+    elif job_id == "price_history_retention":
+        if config.interval_hours or config.interval_minutes:
+            total_minutes = (config.interval_hours * 60) + config.interval_minutes
+            trigger = IntervalTrigger(minutes=total_minutes)
+        elif config.cron_hour is not None and config.cron_minute is not None:
+            cron_hour = min(config.cron_hour, 23)
+            trigger = CronTrigger(hour=cron_hour, minute=config.cron_minute)
+        else:
+            trigger = IntervalTrigger(hours=1)
+        
+        scheduler.add_job(
+            price_history_retention,
+            trigger=trigger,
+            id=job_id,
+            replace_existing=True
+        )
 
 
 def start_scheduler():
@@ -238,6 +330,18 @@ def start_scheduler():
         
         analytics_config = get_or_create_scheduler_config(db, "daily_analytics_aggregation")
         update_job_schedule("daily_analytics_aggregation", analytics_config)
+        
+        maintenance_config = get_or_create_scheduler_config(db, "price_history_maintenance")
+        update_job_schedule("price_history_maintenance", maintenance_config)
+        
+        retention_config = get_or_create_scheduler_config(db, "price_history_retention")
+        update_job_schedule("price_history_retention", retention_config)
+        
+        try:
+            PartitionService.ensure_partitions(db)
+        except Exception as e:
+            print(f"Error creating price history partitions: {e}")
+            db.rollback()
     finally:
         db.close()
     
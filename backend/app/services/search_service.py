@@ -0,0 +1,78 @@
+from sqlalchemy import func, or_, text
+from sqlalchemy.orm import Query, Session
+from typing import Dict, List, Optional
+from app.models.product import Product
+import logging
+
+logger = logging.getLogger(__name__)
+
+_trigram_support: Dict[str, bool] = {}
+
+
+def _like_pattern(value: str, prefix: bool = False) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%" if prefix else f"%{escaped}%"
+
+
+class SearchService:
+    @staticmethod
+    def has_trigram(db: Session) -> bool:
+        bind = db.get_bind()
+        if bind.dialect.name != "postgresql":
+            return False
+        
+        key = str(bind.url)
+        if key not in _trigram_support:
+            _trigram_support[key] = db.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            ).first() is not None
+            if not _trigram_support[key]:
+                logger.warning("pg_trgm extension is not installed, product search falls back to ILIKE")
+        return _trigram_support[key]
+    
+    @staticmethod
+    def filter_products(db: Session, query: Query, search: str) -> Query:
+        search = search.strip()
+        pattern = _like_pattern(search)
+        conditions = [
+            Product.name.ilike(pattern, escape="\\"),
+            Product.category.ilike(pattern, escape="\\"),
+        ]
+        if SearchService.has_trigram(db):
+            conditions.append(Product.name.op("%")(search))
+        return query.filter(or_(*conditions))
+    
+    @staticmethod
+    def rank_products(db: Session, query: Query, search: str) -> Query:
+        query = SearchService.filter_products(db, query, search)
+        if not SearchService.has_trigram(db):
+            return query.order_by(Product.id)
+        
+        search = search.strip()
+        rank = func.greatest(
+            func.similarity(func.coalesce(Product.name, ""), search),
+            func.similarity(func.coalesce(Product.category, ""), search)
+        )
+        return query.order_by(rank.desc(), Product.id)
+    
+    @staticmethod
+    def suggest(db: Session, prefix: str, limit: int = 10) -> List[Dict]:
+        prefix = prefix.strip()
+        if not prefix:
+            return []
+        
+        query = db.query(Product.id, Product.kaspi_id, Product.name).filter(
+            or_(
+                Product.name.ilike(_like_pattern(prefix, prefix=True), escape="\\"),
+                Product.name.ilike(_like_pattern(f" {prefix}"), escape="\\")
+            )
+        )
+        if SearchService.has_trigram(db):
+            query = query.order_by(func.word_similarity(prefix, Product.name).desc(), Product.name)
+        else:
+            query = query.order_by(Product.name)
+        
+        return [
+            {"id": row.id, "kaspi_id": row.kaspi_id, "name": row.name}
+            for row in query.limit(limit).all()
+        ]
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict
+from redis.exceptions import RedisError
+from app.core.config import settings
+from app.core.redis_client import async_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.1
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._do_shared(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def _do_shared(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not settings.SINGLE_FLIGHT_REDIS_ENABLED:
+            return await fn()
+
+        lock_key = f"singleflight:{self.namespace}:{key}:lock"
+        result_key = f"singleflight:{self.namespace}:{key}:result"
+        token = uuid.uuid4().hex
+        try:
+            client = async_redis.client
+            cached = await client.get(result_key)
+            if cached:
+                return json.loads(cached)
+            acquired = await client.set(lock_key, token, nx=True, ex=settings.SINGLE_FLIGHT_LOCK_TTL)
+        except RedisError as e:
+            logger.warning(f"Single-flight Redis unavailable for {key}: {e}")
+            return await fn()
+
+        if acquired:
+            try:
+                result = await fn()
+                try:
+                    await client.set(result_key, json.dumps(result), ex=settings.SINGLE_FLIGHT_RESULT_TTL)
+                except (RedisError, TypeError) as e:
+                    logger.warning(f"Could not share single-flight result for {key}: {e}")
+                return result
+            finally:
+                try:
+                    await client.eval(RELEASE_SCRIPT, 1, lock_key, token)
+                except RedisError as e:
+                    logger.warning(f"Could not release single-flight lock for {key}: {e}")
+
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_TTL
+        while time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                async with client.pipeline(transaction=False) as pipe:
+                    cached, locked = await pipe.get(result_key).exists(lock_key).execute()
+            except RedisError as e:
+                logger.warning(f"Single-flight Redis unavailable for {key}: {e}")
+                break
+            if cached:
+                return json.loads(cached)
+            if not locked:
+                break
+
+        return await fn()
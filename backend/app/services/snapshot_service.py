@@ -0,0 +1,70 @@
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+from datetime import datetime
+from app.models.product import ProductSnapshot
+import statistics
+
+
+class SnapshotService:
+    @staticmethod
+    def build(offers: List[Dict], top_offers: List[Dict], price_buckets: Optional[Dict] = None) -> Dict:
+        prices = sorted(o["price"] for o in offers if o.get("price"))
+        ratings = [o["rating"] for o in offers if o.get("rating")]
+        n = len(prices)
+        
+        total_sellers = (price_buckets or {}).get("total_sellers_count")
+        return {
+            "prices": prices,
+            "min_price": prices[0] if prices else None,
+            "max_price": prices[-1] if prices else None,
+            "avg_price": statistics.mean(prices) if prices else None,
+            "median_price": statistics.median(prices) if prices else None,
+            "p25_price": prices[int(n * 0.25)] if prices else None,
+            "p75_price": prices[int(n * 0.75)] if prices else None,
+            "price_std": (statistics.stdev(prices) if n > 1 else 0) if prices else None,
+            "offers_count": len(offers),
+            "sellers_count": total_sellers or len(offers),
+            "in_stock_count": sum(1 for o in offers if o.get("in_stock", True)),
+            "avg_seller_rating": sum(ratings) / len(ratings) if ratings else None,
+            "top_offers": top_offers,
+            "price_buckets": price_buckets,
+        }
+    
+    @staticmethod
+    def save(
+        db: Session,
+        product_id: int,
+        offers: List[Dict],
+        top_offers: List[Dict],
+        price_buckets: Optional[Dict],
+        fingerprint: Optional[str],
+        parsed_at: datetime
+    ) -> ProductSnapshot:
+        snapshot = db.get(ProductSnapshot, product_id)
+        if snapshot is None:
+            snapshot = ProductSnapshot(product_id=product_id)
+            db.add(snapshot)
+        
+        for field, value in SnapshotService.build(offers, top_offers, price_buckets).items():
+            setattr(snapshot, field, value)
+        snapshot.fingerprint = fingerprint
+        snapshot.parsed_at = parsed_at
+        return snapshot
+    
+    @staticmethod
+    def get(db: Session, product_id: int) -> Optional[ProductSnapshot]:
+        return db.get(ProductSnapshot, product_id)
+    
+    @staticmethod
+    def statistics(snapshot: ProductSnapshot) -> Dict:
+        return {
+            "min_price": snapshot.min_price,
+            "max_price": snapshot.max_price,
+            "avg_price": snapshot.avg_price,
+            "median_price": snapshot.median_price,
+            "price_std": snapshot.price_std
+        }
+    
+    @staticmethod
+    def offers(snapshot: ProductSnapshot) -> List[Dict]:
+        return list(snapshot.top_offers or [])
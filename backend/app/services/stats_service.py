@@ -0,0 +1,93 @@
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+from datetime import date, datetime
+from app.models.analytics import ProductStatsDaily
+from app.models.product import ProductSnapshot
+import math
+
+
+class StatsService:
+    @staticmethod
+    def observe(db: Session, product_id: int, snapshot: ProductSnapshot, observed_at: datetime) -> ProductStatsDaily:
+        day = observed_at.date()
+        insert = sqlite_insert if db.get_bind().dialect.name == "sqlite" else pg_insert
+        db.execute(
+            insert(ProductStatsDaily).values(
+                product_id=product_id,
+                date=day,
+                samples=0,
+                count=0,
+                price_sum=0.0,
+                mean=0.0,
+                m2=0.0
+            ).on_conflict_do_nothing(index_elements=[ProductStatsDaily.product_id, ProductStatsDaily.date])
+        )
+        stats = db.query(ProductStatsDaily).filter(
+            ProductStatsDaily.product_id == product_id,
+            ProductStatsDaily.date == day
+        ).with_for_update().populate_existing().one()
+        
+        for price in snapshot.prices or []:
+            StatsService._push(stats, price)
+        stats.samples += 1
+        stats.updated_at = observed_at
+        return stats
+    
+    @staticmethod
+    def _push(stats: ProductStatsDaily, price: float):
+        stats.count += 1
+        stats.price_sum += price
+        delta = price - stats.mean
+        stats.mean += delta / stats.count
+        stats.m2 += delta * (price - stats.mean)
+        stats.min_price = price if stats.min_price is None else min(stats.min_price, price)
+        stats.max_price = price if stats.max_price is None else max(stats.max_price, price)
+    
+    @staticmethod
+    def get(db: Session, product_id: int, day: Optional[date] = None) -> Optional[ProductStatsDaily]:
+        return db.query(ProductStatsDaily).filter(
+            ProductStatsDaily.product_id == product_id,
+            ProductStatsDaily.date == (day or datetime.utcnow().date())
+        ).first()
+    
+    @staticmethod
+    def get_for_date(db: Session, day: date) -> Dict[int, ProductStatsDaily]:
+        rows = db.query(ProductStatsDaily).filter(ProductStatsDaily.date == day).all()
+        return {row.product_id: row for row in rows}
+    
+    @staticmethod
+    def summary(stats: ProductStatsDaily) -> Dict:
+        return {
+            "date": stats.date,
+            "samples": stats.samples,
+            "count": stats.count,
+            "min_price": stats.min_price,
+            "max_price": stats.max_price,
+            "avg_price": stats.mean if stats.count else None,
+            "price_std": math.sqrt(stats.m2 / (stats.count - 1)) if stats.count > 1 else 0,
+            "price_sum": stats.price_sum,
+            "updated_at": stats.updated_at
+        }
+    
+    @staticmethod
+    def daily_metrics(stats: ProductStatsDaily, snapshot: ProductSnapshot) -> Dict:
+        summary = StatsService.summary(stats)
+        prices = snapshot.prices or []
+        offers = snapshot.top_offers or []
+        return {
+            "min_price": summary["min_price"],
+            "max_price": summary["max_price"],
+            "avg_price": summary["avg_price"],
+            "median_price": snapshot.median_price,
+            "price_std": summary["price_std"],
+            "offers_count": snapshot.offers_count,
+            "unique_sellers": len(set(o.get("seller_name") for o in offers if o.get("seller_name"))),
+            "price_position_1": prices[0] if prices else None,
+            "price_position_3": prices[2] if len(prices) > 2 else None,
+            "price_position_5": prices[4] if len(prices) > 4 else None,
+            "price_position_10": prices[9] if len(prices) > 9 else None,
+            "avg_seller_rating": snapshot.avg_seller_rating,
+            "in_stock_count": snapshot.in_stock_count
+        }
@@ -46,6 +46,8 @@ export interface PositionEstimate {
   estimated_position: number
   total_sellers: number
   percentile: number
+  data_age_seconds?: number | null
+  is_stale?: boolean
 }
 
 export const productsApi = {
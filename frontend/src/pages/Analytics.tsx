@@ -616,6 +616,12 @@ export default function Analytics() {
                       <span className="text-muted-foreground">Процентиль:</span>{' '}
                       <span className="font-semibold">{positionEstimate.percentile.toFixed(1)}%</span>
                     </p>
+                    {positionEstimate.data_age_seconds != null && (
+                      <p className="text-xs text-muted-foreground">
+                        Данные обновлены {Math.round(positionEstimate.data_age_seconds / 60)} мин назад
+                        {positionEstimate.is_stale && ' (обновляются в фоне)'}
+                      </p>
+                    )}
                   </div>
                 </div>
               )}